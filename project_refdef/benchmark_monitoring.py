@@ -0,0 +1,88 @@
+"""
+This script compares the decoding of ERG RawAQData responses in the monitoring module with the 
+original decoding, which parsed the response with res.json() and converted every reading in a Python loop.
+
+The payloads are generated locally, so no requests are sent to the API. Run it with: python benchmark_monitoring.py
+"""
+
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import monitoring
+
+
+def make_payload(weeks, missing_share=0.05):
+    """
+    Returns the bytes of a RawAQData response with hourly readings for the given number of weeks.
+    """
+
+    start = datetime(2024, 1, 1)
+    readings = []
+    for hour in range(weeks * 7 * 24):
+        value = "" if random.random() < missing_share else f"{random.uniform(0, 120):.1f}"
+        readings.append({"@MeasurementDateGMT": (start + timedelta(hours=hour)).strftime("%Y-%m-%d %H:%M:%S"), "@Value": value})
+    return json.dumps({"RawAQData": {"@SiteCode": "MR8", "@SpeciesCode": "NO2", "Data": readings}}).encode()
+
+
+def decode_original(content):
+    """
+    The original decoding of get_live_data_from_api: the whole payload with the json module, then one dict per reading.
+    """
+
+    data = json.loads(content)
+    structured_data_station = []
+    for measurement in data['RawAQData']['Data']:
+        date = measurement['@MeasurementDateGMT']
+        value = measurement['@Value']
+        if value != '':
+            structured_data_station.append({'date': date, 'value': float(value)})
+    return structured_data_station
+
+
+def best_time(function, repeat):
+    """
+    Returns the best time of one call of function in seconds.
+
+    Each of the repeat measurements runs the function as often as Timer.autorange chooses (at least 0.2 seconds
+    in total), so payloads that decode in well under a millisecond are not dominated by timer noise.
+    """
+
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def benchmark(weeks_list=(1, 4, 12, 52), repeat=5):
+    """
+    Prints the best time of each decoding path for payloads of increasing length.
+
+    The 'same backend' columns decode with the json module on both sides, so they measure the conversion
+    of the readings alone. The orjson column shows the bulk path as used when orjson is installed.
+    """
+
+    backend = monitoring.orjson
+    print(f"orjson installed: {backend is not None}")
+    print(f"{'weeks':>6} {'readings':>9} {'original (ms)':>14} {'bulk json (ms)':>15} {'same backend':>13} {'bulk orjson (ms)':>17} {'total':>7}")
+
+    for weeks in weeks_list:
+        content = make_payload(weeks)
+        original = best_time(lambda: decode_original(content), repeat)
+
+        monitoring.orjson = None
+        try:
+            bulk_json = best_time(lambda: monitoring.decode_raw_aq_data(content), repeat)
+        finally:
+            monitoring.orjson = backend
+
+        line = f"{weeks:>6} {weeks * 7 * 24:>9} {original * 1000:>14.2f} {bulk_json * 1000:>15.2f} {original / bulk_json:>12.2f}x"
+        if backend is not None:
+            bulk_orjson = best_time(lambda: monitoring.decode_raw_aq_data(content), repeat)
+            line += f" {bulk_orjson * 1000:>17.2f} {original / bulk_orjson:>6.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    benchmark()
@@ -11,7 +11,7 @@ import importlib
 import reporting
 
 from reporting import get_station_and_data, get_pollutant, daily_average, daily_median, hourly_average, monthly_average
-from reporting import get_user_date, peak_hour_date, count_missing_data, fill_missing_data
+from reporting import get_user_date, get_fill_value, peak_hour_date, count_missing_data, fill_missing_data
 
 from monitoring import get_live_data_from_api, select_option, monitor, get_data_and_calculate, display_results
 
@@ -106,10 +106,12 @@ def reporting_menu():
                     elif option == '4':
                         result = reporting.monthly_average(data, monitoring_station, pollutant)
                     elif option == '5':
+                        date = get_user_date()
                         result = reporting.peak_hour_date(data, date, monitoring_station, pollutant)
                     elif option == '6':
                         result = reporting.count_missing_data(data, monitoring_station, pollutant)
                     elif option == '7':
+                        new_value = get_fill_value()
                         result = reporting.fill_missing_data(data, new_value, monitoring_station, pollutant)
 
                     next_step = input("Press any key to perform another calculation or 'B' to go back to the previous menu: ").upper()
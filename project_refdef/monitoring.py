@@ -14,13 +14,339 @@ Thank you for using the monitoring module.
 """
 
 
-from datetime import datetime, timedelta
-
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+from utils import quantile
+
+# orjson decodes the API responses faster when it is installed, otherwise the json module is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 print("[Welcome to the monitoring module]")
 
 
+# Settings of the HTTP session shared by all API requests of this module (see configure_session)
+api_base_url = "https://api.erg.ic.ac.uk/AirQuality"
+pool_size = 10
+request_timeout = (5, 30)
+
+_session = None
+
+# Guards the creation and replacement of the shared session, which concurrent fetches may request at once
+_session_lock = threading.Lock()
+
+
+def utc_now():
+    """
+    Returns the current time as a naive datetime in UTC (GMT), the time zone of the API's measurement dates.
+    All comparisons with the dates of measurements must use it rather than the local time.
+    """
+
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+
+def configure_session(base_url=None, max_connections=None, timeout=None):
+    """
+    Changes the settings of the shared HTTP session. The session is recreated on the next request.
+
+    Parameters:
+    base_url (str, optional): The base URL of the API, e.g. a local stub server for testing.
+    max_connections (int, optional): The maximum number of kept-alive connections per host (pool_size).
+    timeout (float or tuple, optional): The request timeout in seconds, or a (connect, read) tuple.
+    """
+
+    global api_base_url, pool_size, request_timeout, _session
+
+    with _session_lock:
+        if base_url is not None:
+            api_base_url = base_url.rstrip('/')
+        if max_connections is not None:
+            pool_size = max_connections
+        if timeout is not None:
+            request_timeout = timeout
+
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+
+def get_session():
+    """
+    Returns the HTTP session shared by all API requests, creating it on first use.
+
+    The session keeps connections alive in a pool of pool_size connections per host, so repeated
+    requests do not pay for a new TCP and TLS handshake.
+    """
+
+    global _session
+
+    # Checked again under the lock, so threads that start together still share one session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+
+    return _session
+
+
+
+class Measurements:
+    """
+    A compact, columnar series of measurements: a datetime64 array of measurement dates and a float64 array of values.
+
+    Iterating yields {'date': 'YYYY-MM-DD HH:MM:SS', 'value': float} dictionaries, the form earlier versions of 
+    get_live_data_from_api returned, but the statistics work on the arrays directly.
+
+    Parameters:
+    dates (array-like): The measurement dates (GMT), as datetime64 values or 'YYYY-MM-DD HH:MM:SS' strings.
+    values (array-like): The measured values.
+    """
+
+    __slots__ = ('dates', 'values')
+
+    def __init__(self, dates=(), values=()):
+        self.dates = np.asarray(dates, dtype='datetime64[s]')
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.dates.shape != self.values.shape:
+            raise ValueError("The dates and the values must have the same length.")
+
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Creates the measurements from a list of {'date': ..., 'value': ...} dictionaries.
+        """
+
+        if isinstance(records, cls):
+            return records
+        return cls([record['date'] for record in records], [record['value'] for record in records])
+
+
+    def __len__(self):
+        return len(self.values)
+
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield {'date': self.date_string(i), 'value': float(self.values[i])}
+
+
+    def __getitem__(self, rows):
+        return Measurements(self.dates[rows], self.values[rows])
+
+
+    def __repr__(self):
+        return f"Measurements({len(self)} values)"
+
+
+    def date_string(self, i):
+        """
+        Returns the date of the i-th measurement in the API's 'YYYY-MM-DD HH:MM:SS' format.
+        """
+
+        return str(self.dates[i]).replace('T', ' ')
+
+
+    def since(self, start):
+        """
+        Returns the measurements from the date start onwards. The dates must be sorted.
+        """
+
+        return self[np.searchsorted(self.dates, np.datetime64(start, 's')):]
+
+
+    def to_json(self):
+        return json.dumps({'dates': self.dates.astype(np.int64).tolist(), 'values': self.values.tolist()})
+
+
+    @classmethod
+    def from_json(cls, text):
+        arrays = json.loads(text)
+        return cls(np.array(arrays['dates'], dtype=np.int64).astype('datetime64[s]'), arrays['values'])
+
+
+
+def decode_raw_aq_data(content):
+    """
+    Decodes the bytes of an ERG RawAQData JSON response straight into Measurements.
+
+    Parameters:
+    content (bytes): The body of the API response.
+
+    Returns:
+    Measurements: The measurement dates and values. Hours with an empty '@Value' are left out.
+
+    Raises:
+    requests.exceptions.InvalidJSONError: If the content is not valid JSON or is not a RawAQData payload,
+    e.g. it has no 'Data' or a reading without a date or value.
+
+    Note:
+    The payload is decoded with orjson if it is installed, otherwise with the json module. The readings are 
+    then converted to a datetime64 and a float64 array directly, without building a dictionary or list per 
+    available reading. With the same JSON backend this is about as fast as the original loop; the gain comes 
+    from orjson, as decoding the JSON remains the largest cost (see benchmark_monitoring.py).
+    """
+
+    try:
+        payload = orjson.loads(content) if orjson is not None else json.loads(content)
+        readings = payload['RawAQData']['Data']
+
+        # A period with a single reading is returned as an object instead of a list
+        if isinstance(readings, dict):
+            readings = [readings]
+
+        # Both arrays are filled straight from the decoded readings; an empty value (an hour without data) becomes NaN
+        dates = np.array([reading['@MeasurementDateGMT'] for reading in readings], dtype='datetime64[s]')
+        values = np.fromiter((reading['@Value'] or 'nan' for reading in readings), dtype=np.float64, count=len(readings))
+    except (ValueError, KeyError, TypeError) as err:
+        raise requests.exceptions.InvalidJSONError(f"Error decoding JSON response: {err!r}")
+
+    available = ~np.isnan(values)
+    return Measurements(dates[available], values[available])
+
+
+
+class ResponseCache:
+    """
+    A cache of API responses keyed by (site code, species code, start date, end date).
+
+    Entries are kept in an in-memory LRU of maxsize entries. Responses for periods that end before today are 
+    final and never expire; responses that include today expire after ttl seconds, because the latest hours 
+    are still being added. If a path is given, entries are also persisted in a SQLite database there, so 
+    they survive restarts. Expired rows are deleted from the database when it is opened and on every write, 
+    so it only holds the final responses and the ones that are still valid.
+
+    Note:
+    The ttl also bounds how far the MeasurementStore lags behind the API: sync_measurements asks for the 
+    period up to today, which may be answered from this cache, so stored data can be up to ttl seconds old 
+    when the sync returns. Lower the ttl (or set response_cache to None) for fresher data.
+
+    Parameters:
+    maxsize (int, optional): The maximum number of entries kept in memory. Defaults to 256.
+    ttl (float, optional): The time to live in seconds of responses that include today. Defaults to 3600.
+    path (str, optional): The path of the SQLite database. Defaults to None (memory only).
+    """
+
+    def __init__(self, maxsize=256, ttl=3600, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if path is not None:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, expires REAL)")
+            self._purge()
+            self._db.commit()
+
+
+    @staticmethod
+    def make_key(site_code, species_code, start_date, end_date):
+        return (str(site_code), str(species_code), str(start_date), str(end_date))
+
+
+    def _expiry(self, key):
+        # Periods ending before today are final, None means the entry never expires
+        end_date = key[3]
+        return None if end_date < utc_now().date().isoformat() else time.time() + self.ttl
+
+
+    def get(self, key):
+        """
+        Returns the cached measurements for a key, or None if there is no valid entry.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None and self._db is not None:
+                row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (json.dumps(key),)).fetchone()
+                if row is not None:
+                    entry = (Measurements.from_json(row[0]), row[1])
+                    self._store(key, entry)
+
+            if entry is None:
+                return None
+
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                if self._db is not None:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (json.dumps(key),))
+                    self._db.commit()
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+
+    def set(self, key, value):
+        """
+        Caches the measurements for a key. The arrays are made read-only, as they are shared by every caller.
+        """
+
+        value.dates.setflags(write=False)
+        value.values.setflags(write=False)
+        entry = (value, self._expiry(key))
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)", (json.dumps(key), value.to_json(), entry[1]))
+                self._purge()
+                self._db.commit()
+
+
+    def _purge(self):
+        # Rows of periods that include today are replaced by a new key once the day is over, so they are deleted here
+        self._db.execute("DELETE FROM responses WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+    def clear(self):
+        """
+        Removes every entry from memory and from the database.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+
+
+# Cache used by fetch_measurements. Replace it, e.g. with ResponseCache(path="responses.sqlite"), or set it to None to disable caching
+response_cache = ResponseCache()
+
+
+
 def get_live_data_from_api(station_code, species_code='NO2', start_date=None, end_date=None):
     """
     Fetches air quality data from the ERG Air Quality API for a specified station and species code.
@@ -32,14 +358,52 @@ def get_live_data_from_api(station_code, species_code='NO2', start_date=None, en
     end_date (datetime.date, optional): The end date of the data fetching period. If not specified, defaults to one day after the start date.
 
     Returns:
-    list: A list of dictionaries containing air quality data. Each dictionary has 'date' and 'value' keys.
-    If an error occurs during the API request, returns an empty list.
+    Measurements: The measurement dates and values, see Measurements.
+    If an error occurs during the API request, returns empty measurements.
+
+    Note:
+    The request goes through the shared session (see get_session) and times out after request_timeout.
+    """
+
+    try:
+        return fetch_measurements(station_code, species_code, start_date, end_date)
+    except requests.exceptions.HTTPError as err:
+        print(f"HTTP error occurred: {err}")
+    except requests.exceptions.InvalidJSONError:
+        print("Error decoding JSON response")
+    except requests.exceptions.RequestException as err:
+        print(f"Request to the API failed: {err}")
+
+    return Measurements()
+
+
+
+def fetch_measurements(station_code, species_code='NO2', start_date=None, end_date=None, timeout=None):
+    """
+    Fetches air quality data like get_live_data_from_api, but raises errors instead of printing them.
+
+    Parameters:
+    station_code (str): The code of the air quality monitoring station.
+    species_code (str, optional): The pollutant species code. Defaults to 'NO2'.
+    start_date (datetime.date, optional): The start date of the data fetching period. Defaults to today's date.
+    end_date (datetime.date, optional): The end date of the data fetching period. Defaults to one day after the start date.
+    timeout (float or tuple, optional): The request timeout. Defaults to request_timeout.
+
+    Returns:
+    Measurements: The measurement dates and values. Hours without a value are left out.
+
+    Note:
+    Successful responses are kept in response_cache, so repeated requests for the same station, species 
+    and period are answered without calling the API.
+
+    Raises:
+    requests.exceptions.RequestException: If the request fails, times out, returns an HTTP error or invalid JSON.
     """
 
-    start_date = datetime.date.today() if start_date is None else start_date
-    end_date = start_date + datetime.timedelta(days=1) if end_date is None else end_date
+    start_date = utc_now().date() if start_date is None else start_date
+    end_date = start_date + timedelta(days=1) if end_date is None else end_date
 
-    endpoint = "https://api.erg.ic.ac.uk/AirQuality/Data/SiteSpecies/SiteCode={site_code}/SpeciesCode={species_code}/StartDate={start_date}/EndDate={end_date}/Json"
+    endpoint = api_base_url + "/Data/SiteSpecies/SiteCode={site_code}/SpeciesCode={species_code}/StartDate={start_date}/EndDate={end_date}/Json"
 
     url = endpoint.format(
         site_code=station_code,
@@ -48,36 +412,241 @@ def get_live_data_from_api(station_code, species_code='NO2', start_date=None, en
         end_date=end_date
     )
 
-    res = requests.get(url)
+    cache_key = ResponseCache.make_key(station_code, species_code, start_date, end_date)
+    if response_cache is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    # Check for HTTP errors
-    try:
-        res.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        print(f"HTTP error occurred: {err}")
-        return {}
+    res = get_session().get(url, timeout=request_timeout if timeout is None else timeout)
+    res.raise_for_status()
 
-    # Parse JSON data
-    try:
-        data = res.json()
-    except requests.exceptions.JSONDecodeError:
-        print("Error decoding JSON response")
-        return {}
+    structured_data_station = decode_raw_aq_data(res.content)
 
-    # Extract the data into a structured format
-    measurements = data['RawAQData']['Data']
-    structured_data_station = []
+    if response_cache is not None:
+        response_cache.set(cache_key, structured_data_station)
 
-    for measurement in measurements:
-        date = measurement['@MeasurementDateGMT']
-        value = measurement['@Value']
+    return structured_data_station
 
-        # If value is an empty string, the data for that hour is not available and need to be ignored
-        if value != '':
-            # Create a dictionary for each measurement and append it to the list
-            structured_data_station.append({'date': date, 'value': float(value)})
 
-    return structured_data_station
+
+def _is_transient(err):
+    """
+    Returns True if a failed request may succeed when retried: timeouts, connection errors and 5xx responses.
+    Other HTTP errors (e.g. an unknown site code) and malformed payloads fail the same way every time.
+    """
+
+    if isinstance(err, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(err, requests.exceptions.HTTPError):
+        return err.response is not None and err.response.status_code >= 500
+    return False
+
+
+
+async def _fetch_with_retries(semaphore, station_code, species_code, start_date, end_date, timeout, retries, backoff):
+    """
+    Fetches one station and species pair in a worker thread, retrying transient failures with exponential backoff.
+
+    Returns:
+    Measurements: The measurements, or empty measurements if every attempt failed or the failure was not transient.
+    """
+
+    for attempt in range(retries + 1):
+        # The slot is held until the worker thread has finished; the request itself times out through the session
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(fetch_measurements, station_code, species_code, start_date, end_date, timeout)
+            except requests.exceptions.RequestException as err:
+                error = err
+
+        if not _is_transient(error):
+            print(f"Failed to fetch {species_code} at {station_code}: {error!r}")
+            return Measurements()
+
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+    print(f"Failed to fetch {species_code} at {station_code} after {retries + 1} attempts: {error!r}")
+    return Measurements()
+
+
+
+async def fetch_many_async(pairs=None, start_date=None, end_date=None, concurrency=8, timeout=10, retries=2, backoff=0.5):
+    """
+    Fetches many station and species pairs concurrently.
+
+    Parameters:
+    pairs (iterable of tuple, optional): (station code, species code) pairs, e.g. ('MR8', 'PM10').
+    Defaults to every station in stations with every species in pollutants.
+    start_date (datetime.date, optional): The start date of the data fetching period. Defaults to today's date.
+    end_date (datetime.date, optional): The end date of the data fetching period. Defaults to one day after the start date.
+    concurrency (int, optional): The maximum number of requests in flight at the same time. Defaults to 8.
+    timeout (float, optional): The connect and read timeout of each request in seconds, enforced by the session. Defaults to 10.
+    retries (int, optional): How often a request that timed out, could not connect or got a 5xx response is retried. Defaults to 2.
+    backoff (float, optional): The delay before the first retry in seconds, doubled for every further retry. Defaults to 0.5.
+
+    Returns:
+    dict: The measurements of every pair, keyed by (station code, species code), in the form returned
+    by get_live_data_from_api. Pairs that failed on every attempt, or returned a malformed payload, have empty measurements.
+
+    Raises:
+    ValueError: If retries is negative.
+
+    Note:
+    The requests share the pooled session (see get_session), so pool_size should be at least the concurrency.
+    Other HTTP errors, such as 404 for an unknown site code, and malformed payloads are not retried.
+    """
+
+    if retries < 0:
+        raise ValueError(f"Invalid number of retries {retries}. Please use 0 or more.")
+
+    if pairs is None:
+        pairs = [(station['code'], species) for station in stations.values() for species in pollutants.values()]
+    pairs = list(pairs)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(_fetch_with_retries(semaphore, station_code, species_code, start_date, end_date, timeout, retries, backoff)
+                                     for station_code, species_code in pairs), return_exceptions=True)
+
+    # An unexpected error of one pair must not abort the others
+    for i, (pair, result) in enumerate(zip(pairs, results)):
+        if isinstance(result, Exception):
+            print(f"Failed to fetch {pair[1]} at {pair[0]}: {result!r}")
+            results[i] = Measurements()
+
+    return dict(zip(pairs, results))
+
+
+
+def fetch_many(pairs=None, start_date=None, end_date=None, concurrency=8, timeout=10, retries=2, backoff=0.5):
+    """
+    Fetches many station and species pairs concurrently from synchronous code. See fetch_many_async.
+    """
+
+    return asyncio.run(fetch_many_async(pairs, start_date, end_date, concurrency, timeout, retries, backoff))
+
+
+
+class MeasurementStore:
+    """
+    A local append-only store of fetched measurements, with one CSV file per station and species.
+
+    Each file holds 'date,value' lines in time order. Only measurements newer than the last stored one are 
+    appended, so the API only needs to be asked for the period after the last stored hour (see sync_measurements).
+
+    Parameters:
+    directory (str): The directory of the store files. It is created when the first measurement is stored.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._series = {}
+        self._lock = threading.Lock()
+
+
+    def _path(self, station_code, species_code):
+        return os.path.join(self.directory, f"{station_code}_{species_code}.csv")
+
+
+    def _load(self, station_code, species_code):
+        # The file of a station and species is read once, later appends update the arrays in memory as well
+        key = (station_code, species_code)
+        if key not in self._series:
+            series = Measurements()
+            path = self._path(station_code, species_code)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                columns = np.loadtxt(path, delimiter=',', dtype=str, ndmin=2)
+                series = Measurements(columns[:, 0], columns[:, 1].astype(np.float64))
+            self._series[key] = series
+        return self._series[key]
+
+
+    def last_date(self, station_code, species_code):
+        """
+        Returns the date of the last stored measurement ('YYYY-MM-DD HH:MM:SS'), or None if there is none.
+        """
+
+        with self._lock:
+            series = self._load(station_code, species_code)
+            return series.date_string(-1) if len(series) else None
+
+
+    def append(self, station_code, species_code, measurements):
+        """
+        Appends the measurements that are newer than the last stored one.
+
+        Returns:
+        int: The number of measurements appended.
+        """
+
+        measurements = Measurements.from_records(measurements)
+
+        with self._lock:
+            series = self._load(station_code, species_code)
+            new = measurements
+            if len(series):
+                new = measurements[measurements.dates > series.dates[-1]]
+            new = new[np.argsort(new.dates, kind='stable')]
+
+            if len(new):
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self._path(station_code, species_code), 'a') as f:
+                    f.writelines(f"{new.date_string(i)},{float(new.values[i])!r}\n" for i in range(len(new)))
+                self._series[(station_code, species_code)] = Measurements(np.concatenate([series.dates, new.dates]),
+                                                                          np.concatenate([series.values, new.values]))
+
+            return len(new)
+
+
+    def read(self, station_code, species_code, since=None):
+        """
+        Returns the stored measurements from the date since ('YYYY-MM-DD HH:MM:SS') onwards, or all of them.
+        """
+
+        with self._lock:
+            series = self._load(station_code, species_code)
+            return series if since is None else series.since(since)
+
+
+
+def sync_measurements(store, station_code, species_code, start_date):
+    """
+    Brings the local store of a station and species up to date and returns its measurements since start_date.
+
+    Parameters:
+    store (MeasurementStore): The local store.
+    station_code (str): The code of the air quality monitoring station.
+    species_code (str): The pollutant species code.
+    start_date (datetime): The start of the period of interest.
+
+    Returns:
+    Measurements: The stored measurements from start_date onwards.
+
+    Note:
+    The API is only asked for the days from the last stored measurement (or from start_date if nothing is 
+    stored yet, or the stored data is older) until today, so the amount fetched grows with the new data, 
+    not with the length of the period. That request may be answered from response_cache, so the returned 
+    data can be up to response_cache.ttl seconds behind the API.
+    """
+
+    last = store.last_date(station_code, species_code)
+    fetch_start = start_date.date()
+    if last is not None:
+        fetch_start = max(fetch_start, datetime.strptime(last[:10], '%Y-%m-%d').date())
+
+    fetch_end = utc_now().date() + timedelta(days=1)
+    store.append(station_code, species_code, get_live_data_from_api(station_code, species_code, fetch_start, fetch_end))
+
+    return store.read(station_code, species_code, since=start_date)
+
+
+
+# Local store used by get_data_and_calculate, next to this module. Set it to None to always fetch the whole time frame
+measurement_store = MeasurementStore(os.path.join(os.path.dirname(os.path.abspath(__file__)), "live_data"))
+
+# Length of the time frames offered by monitor()
+time_frame_lengths = {'1': timedelta(hours=1), '2': timedelta(days=1), '3': timedelta(weeks=1)}
 
 
 
@@ -92,6 +661,9 @@ stations = {"H": {"name": "Harlington", "code": "LH0"},
             "M": {"name": "Marylebone", "code": "MR8"}, 
             "NK": {"name": "N Kensington", "code": "KC1"}}
 
+# Dictionary of available pollutants (species codes)
+pollutants = {"1": "NO2", "2": "CO", "3": "PM10", "4": "PM25"}
+
 
 
 def select_option(prompt, options, go_back_message="- Press [B] to go back", quit_message="- Press [Q] to quit"):
@@ -164,7 +736,7 @@ def get_data_and_calculate(selected_station, selected_pollutant, selected_time_f
             Tuple[str, str]: Start and end dates in 'YYYY-MM-DD' format.
         """
 
-        current_date = datetime.now().date()
+        current_date = utc_now().date()
         start_date = current_date  
 
         # Adjust the start date based on the selected time frame
@@ -190,43 +762,37 @@ def get_data_and_calculate(selected_station, selected_pollutant, selected_time_f
     # Initialize result to a default value
     result = None  
 
-    # Fetch data from the API
-    try:
+    # With a local store, only the hours after the last stored one are fetched and the time frame is read from the store
+    if measurement_store is not None and selected_time_frame in time_frame_lengths:
+        window_start = utc_now() - time_frame_lengths[selected_time_frame]
+        data = sync_measurements(measurement_store, selected_station, selected_pollutant, window_start)
+    else:
+        # Fetch data from the API once, errors are reported by get_live_data_from_api as an empty list
         data = get_live_data_from_api(selected_station, species_code=selected_pollutant, start_date=start_date_str, end_date=end_date_str)
-    except requests.exceptions.HTTPError:
-        print("Failed to get data from API")
-        return result
 
-    data = get_live_data_from_api(selected_station, species_code=selected_pollutant, start_date=start_date_str, end_date=end_date_str)
 
+    # The statistics work on the value array, lists of {'date', 'value'} dictionaries are converted first
+    data = Measurements.from_records(data)
 
     # Calculate statistics
     def calculate_average(data):
-        total = sum(measurement['value'] for measurement in data)
-        count = len(data)
-
-        return total / count if count > 0 else 0
+        return float(data.values.mean()) if len(data) > 0 else 0
 
     def calculate_median(data):
-        values = sorted(measurement['value'] for measurement in data)
-        mid = len(values) // 2
-
-        if len(values) % 2 == 0:  
-            median = (values[mid - 1] + values[mid]) / 2
-        else:
-            median = values[mid]
-
-        return median
+        # Selection instead of a full sort, see utils.quantile
+        return quantile(data.values, 0.5) if len(data) > 0 else None
 
     def calculate_min(data):
-        min_measurement = min(data, key=lambda x: x['value'], default=None)
-
-        return (min_measurement['value'], min_measurement['date']) if min_measurement else (None, None)
+        if len(data) == 0:
+            return (None, None)
+        i = int(np.argmin(data.values))
+        return (float(data.values[i]), data.date_string(i))
 
     def calculate_max(data):
-        max_measurement = max(data, key=lambda x: x['value'], default=None)
-
-        return (max_measurement['value'], max_measurement['date']) if max_measurement else (None, None)
+        if len(data) == 0:
+            return (None, None)
+        i = int(np.argmax(data.values))
+        return (float(data.values[i]), data.date_string(i))
 
     # Perform the selected calculation
     if selected_calculation == "1":  
@@ -251,8 +817,7 @@ def monitor():
     The process repeats until the user chooses to quit.
     """
     
-    # Dictionary of available pollutants, time frames, calclations
-    pollutants = {"1": "NO2", "2": "CO", "3": "PM10", "4": "PM25"}
+    # Dictionary of available time frames, calclations
     time_frames = {"1": "Latest hour", "2": "Latest day", "3": "Latest week"}
     calculations = {"1": "Average", "2": "Median", "3": "Min", "4": "Max"}
 
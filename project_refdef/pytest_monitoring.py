@@ -1,25 +1,326 @@
 # Very simple pytest for monitoring
 
+import json
+import threading
+import unittest.mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
+import monitoring
 from monitoring import get_data_and_calculate
+from monitoring import get_live_data_from_api, configure_session, fetch_many, fetch_measurements, ResponseCache
+from monitoring import MeasurementStore, sync_measurements, Measurements, decode_raw_aq_data
 
-def test_get_data_and_calculate():
+def test_get_data_and_calculate(monkeypatch):
     """
     Test the get_data_and_calculate function with mock data.
     """
     
-    # Create fake data that resembles what the function would get from an API
+    # Create fake data that resembles what get_live_data_from_api returns
     mock_data = [
-        {"speciesCode": "NO2", "value": 10.0},
-        {"speciesCode": "NO2", "value": 20.0},
-        {"speciesCode": "NO2", "value": 30.0},
+        {"date": "2024-01-01 00:00:00", "value": 10.0},
+        {"date": "2024-01-01 01:00:00", "value": 20.0},
+        {"date": "2024-01-01 02:00:00", "value": 30.0},
     ]
 
-    # Patch the function to return mock data instead of making an API call
-    # This example assumes that there is a function `get_mock_data` 
+    # Patch the function to return mock data instead of making an API call, without the local store
+    monkeypatch.setattr(monitoring, "measurement_store", None)
     with unittest.mock.patch('monitoring.get_live_data_from_api', return_value=mock_data):
-        # Call the function with some arbitrary arguments
-        result = get_data_and_calculate('some_station', 'NO2', 'past_24_hours', 'mean')
+        # Time frame '2' is the past 24 hours and calculation '1' the mean
+        result = get_data_and_calculate('some_station', 'NO2', '2', '1')
     
     # Assert that the function correctly calculates the mean of the mock data
     assert result == 20.0
+
+
+# Readings served by the stub API. An empty '@Value' is an hour without data
+stub_readings = [
+    {"@MeasurementDateGMT": "2024-01-01 00:00:00", "@Value": "10.0"},
+    {"@MeasurementDateGMT": "2024-01-01 01:00:00", "@Value": ""},
+    {"@MeasurementDateGMT": "2024-01-01 02:00:00", "@Value": "30.0"},
+    {"@MeasurementDateGMT": "2024-01-01 03:00:00", "@Value": "20.0"},
+]
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """
+    Mimics the ERG SiteSpecies endpoint, answering every request with the RawAQData JSON of stub_readings.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        if "SiteCode=FLAKY" in self.path and self.server.flaky_failures > 0:
+            self.server.flaky_failures -= 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if "SiteCode=BAD" in self.path or "SiteCode=UNKNOWN" in self.path:
+            self.send_response(500 if "SiteCode=BAD" in self.path else 404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if "SiteCode=NODATA" in self.path:
+            body = json.dumps({"RawAQData": {"@SiteCode": "NODATA"}}).encode()
+        elif "SiteCode=MALFORMED" in self.path:
+            body = b'{"RawAQData": '
+        else:
+            body = json.dumps({"RawAQData": {"@SiteCode": "MR8", "Data": stub_readings}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api():
+    """
+    Starts the stub API on a local port and points the monitoring session at it.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPIHandler)
+    server.connections = 0
+    server.paths = []
+    server.flaky_failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    previous = (monitoring.api_base_url, monitoring.pool_size, monitoring.request_timeout)
+    previous_cache, previous_store = monitoring.response_cache, monitoring.measurement_store
+    configure_session(base_url=f"http://127.0.0.1:{server.server_port}/AirQuality", timeout=5)
+    monitoring.response_cache = None
+    monitoring.measurement_store = None
+    yield server
+
+    configure_session(*previous)
+    monitoring.response_cache, monitoring.measurement_store = previous_cache, previous_store
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_live_data_from_api_reuses_connection(stub_api):
+    """
+    Test that get_live_data_from_api parses the RawAQData payload and reuses one kept-alive connection.
+    """
+    for _ in range(3):
+        data = get_live_data_from_api("MR8", "NO2", "2024-01-01", "2024-01-02")
+        assert [measurement["value"] for measurement in data] == [10.0, 30.0, 20.0]
+
+    assert stub_api.connections == 1
+    assert stub_api.paths[0] == "/AirQuality/Data/SiteSpecies/SiteCode=MR8/SpeciesCode=NO2/StartDate=2024-01-01/EndDate=2024-01-02/Json"
+    assert len(get_live_data_from_api("BAD", "NO2", "2024-01-01", "2024-01-02")) == 0
+
+
+def test_get_data_and_calculate_fetches_once(stub_api):
+    """
+    Test that get_data_and_calculate makes a single API request per calculation.
+    """
+    assert get_data_and_calculate("MR8", "NO2", "2", "1") == 20.0
+    assert get_data_and_calculate("MR8", "NO2", "2", "4") == (30.0, "2024-01-01 02:00:00")
+    assert len(stub_api.paths) == 2
+
+
+def test_fetch_many(stub_api):
+    """
+    Test that fetch_many fetches every pair, retries transient failures only and reports pairs that keep failing.
+    """
+    stub_api.flaky_failures = 2
+    pairs = [(code, species) for code in ["LH0", "MR8", "KC1"] for species in ["NO2", "CO", "PM10", "PM25"]]
+    pairs += [("FLAKY", "NO2"), ("NODATA", "NO2"), ("UNKNOWN", "NO2"), ("MALFORMED", "NO2"), ("BAD", "NO2")]
+
+    results = fetch_many(pairs, "2024-01-01", "2024-01-02", concurrency=4, timeout=5, retries=2, backoff=0.01)
+
+    assert list(results) == pairs
+    assert all(len(results[pair]) == 3 for pair in pairs[:-4])
+    assert all(len(results[pair]) == 0 for pair in pairs[-4:])
+    assert len(get_live_data_from_api("NODATA", "NO2", "2024-01-01", "2024-01-02")) == 0
+    assert sum("SiteCode=FLAKY" in path for path in stub_api.paths) == 3
+    assert sum("SiteCode=BAD" in path for path in stub_api.paths) == 3
+
+    # A 404 and a malformed payload fail the same way every time and are requested only once
+    assert sum("SiteCode=UNKNOWN" in path for path in stub_api.paths) == 1
+    assert sum("SiteCode=MALFORMED" in path for path in stub_api.paths) == 1
+
+    with pytest.raises(ValueError):
+        fetch_many(pairs, "2024-01-01", "2024-01-02", retries=-1)
+
+
+def test_response_cache(stub_api, tmp_path, monkeypatch):
+    """
+    Test that responses are cached, that only periods including today expire, and that the SQLite store persists them.
+    """
+    path = str(tmp_path / "responses.sqlite")
+    monitoring.response_cache = ResponseCache(maxsize=2, ttl=60, path=path)
+    today = monitoring.utc_now().date()
+    tomorrow = today + monitoring.timedelta(days=1)
+
+    for _ in range(3):
+        assert len(fetch_measurements("MR8", "NO2", "2024-01-01", "2024-01-02")) == 3
+        assert len(fetch_measurements("MR8", "NO2", today, tomorrow)) == 3
+    assert len(stub_api.paths) == 2
+
+    # After the time to live only the period including today is fetched again
+    now = monitoring.time.time()
+    monkeypatch.setattr(monitoring.time, "time", lambda: now + 120)
+    fetch_measurements("MR8", "NO2", "2024-01-01", "2024-01-02")
+    fetch_measurements("MR8", "NO2", today, tomorrow)
+    assert len(stub_api.paths) == 3
+
+    # A new cache on the same database answers the past period without a request
+    monitoring.response_cache = ResponseCache(path=path)
+    assert len(fetch_measurements("MR8", "NO2", "2024-01-01", "2024-01-02")) == 3
+    assert len(stub_api.paths) == 3
+
+
+def test_response_cache_deletes_expired_rows(stub_api, tmp_path, monkeypatch):
+    """
+    Test that expired rows are deleted from the SQLite store instead of piling up.
+    """
+    path = str(tmp_path / "responses.sqlite")
+    monitoring.response_cache = ResponseCache(ttl=60, path=path)
+    today = monitoring.utc_now().date()
+    rows = lambda: monitoring.response_cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    fetch_measurements("MR8", "NO2", "2024-01-01", "2024-01-02")
+    fetch_measurements("MR8", "NO2", today, today + monitoring.timedelta(days=1))
+    assert rows() == 2
+
+    # Once expired, the row of today is deleted on the next write and on reading it
+    now = monitoring.time.time()
+    monkeypatch.setattr(monitoring.time, "time", lambda: now + 120)
+    fetch_measurements("MR8", "NO2", "2024-01-02", "2024-01-03")
+    assert rows() == 2
+    assert monitoring.response_cache.get(ResponseCache.make_key("MR8", "NO2", today, today + monitoring.timedelta(days=1))) is None
+    assert rows() == 2
+
+    # A stale row left by an older process is deleted when the database is opened
+    monitoring.response_cache._db.execute("INSERT INTO responses VALUES ('stale', '{}', ?)", (now,))
+    monitoring.response_cache._db.commit()
+    monitoring.response_cache = ResponseCache(path=path)
+    assert rows() == 2
+
+
+def test_measurement_store(stub_api, tmp_path):
+    """
+    Test that the local store only appends new measurements and only asks the API for the days after the last stored one.
+    """
+    store = MeasurementStore(str(tmp_path / "live"))
+    start = monitoring.datetime(2024, 1, 1)
+
+    data = sync_measurements(store, "MR8", "NO2", start)
+    assert [m["value"] for m in data] == [10.0, 30.0, 20.0]
+    assert store.last_date("MR8", "NO2") == "2024-01-01 03:00:00"
+
+    # The next sync starts at the day of the last stored measurement and appends nothing twice
+    stub_readings.append({"@MeasurementDateGMT": "2024-01-01 04:00:00", "@Value": "40.0"})
+    try:
+        data = sync_measurements(store, "MR8", "NO2", monitoring.datetime(2024, 1, 1, 2))
+    finally:
+        stub_readings.pop()
+    assert [m["value"] for m in data] == [30.0, 20.0, 40.0]
+    assert all("StartDate=2024-01-01" in path for path in stub_api.paths)
+
+    # A new store on the same directory reads the appended file
+    reopened = MeasurementStore(str(tmp_path / "live"))
+    assert len(reopened.read("MR8", "NO2")) == 4
+    assert reopened.append("MR8", "NO2", [{"date": "2024-01-01 00:00:00", "value": 1.0}]) == 0
+
+
+def test_measurements(monkeypatch):
+    """
+    Test the columnar Measurements representation.
+    """
+    records = [{"date": "2024-01-01 00:00:00", "value": 10.0}, {"date": "2024-01-01 02:00:00", "value": 30.0}]
+    measurements = Measurements.from_records(records)
+    assert measurements.dates.dtype == "datetime64[s]" and measurements.values.dtype == "float64"
+    assert list(measurements) == records
+    assert len(measurements.since("2024-01-01 01:00:00")) == 1
+    assert list(Measurements.from_json(measurements.to_json())) == records
+
+    monkeypatch.setattr(monitoring, "measurement_store", None)
+    with unittest.mock.patch("monitoring.get_live_data_from_api", return_value=measurements):
+        assert get_data_and_calculate("MR8", "NO2", "2", "1") == 20.0
+        assert get_data_and_calculate("MR8", "NO2", "2", "2") == 20.0
+        assert get_data_and_calculate("MR8", "NO2", "2", "3") == (10.0, "2024-01-01 00:00:00")
+    with unittest.mock.patch("monitoring.get_live_data_from_api", return_value=Measurements()):
+        assert get_data_and_calculate("MR8", "NO2", "2", "4") == (None, None)
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_decode_raw_aq_data(monkeypatch, use_orjson):
+    """
+    Test that decode_raw_aq_data gives the same measurements with orjson and with the json module.
+    """
+    if not use_orjson:
+        monkeypatch.setattr(monitoring, "orjson", None)
+
+    content = json.dumps({"RawAQData": {"Data": stub_readings}}).encode()
+    measurements = decode_raw_aq_data(content)
+    assert measurements.values.tolist() == [10.0, 30.0, 20.0]
+    assert measurements.date_string(1) == "2024-01-01 02:00:00"
+
+    single = json.dumps({"RawAQData": {"Data": stub_readings[0]}}).encode()
+    assert len(decode_raw_aq_data(single)) == 1
+
+    for malformed in [b"<html>Service unavailable</html>", b'{"RawAQData": {}}', b'{"RawAQData": null}',
+                      b'{"RawAQData": {"Data": [{"@Value": "1.0"}]}}']:
+        with pytest.raises(monitoring.requests.exceptions.InvalidJSONError):
+            decode_raw_aq_data(malformed)
+
+
+def test_utc_time_frames(tmp_path, monkeypatch):
+    """
+    Test that the time frames are measured in UTC like the API dates, whatever the local time zone.
+    """
+    import time
+    monkeypatch.setenv("TZ", "Etc/GMT-14")
+    time.tzset()
+    try:
+        recent = (monitoring.utc_now() - monitoring.timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
+        store = MeasurementStore(str(tmp_path / "live"))
+        store.append("MR8", "NO2", [{"date": recent, "value": 42.0}])
+        monkeypatch.setattr(monitoring, "measurement_store", store)
+        with unittest.mock.patch("monitoring.get_live_data_from_api", return_value=Measurements()):
+            assert get_data_and_calculate("MR8", "NO2", "1", "1") == 42.0
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
+
+
+def test_session_shared_between_threads(monkeypatch):
+    """
+    Test that threads asking for the session at the same time all get the same one.
+    """
+    configure_session()
+    barrier = threading.Barrier(8)
+    sessions = []
+
+    def create_session(*args, **kwargs):
+        session = original_session(*args, **kwargs)
+        threading.Event().wait(0.05)
+        return session
+
+    original_session = monitoring.requests.Session
+    monkeypatch.setattr(monitoring.requests, "Session", create_session)
+
+    def worker():
+        barrier.wait()
+        sessions.append(monitoring.get_session())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(sessions) == 8 and len({id(session) for session in sessions}) == 1
+    configure_session()
+
@@ -1,8 +1,22 @@
 # Pytest for reporting module
 
+import os
+import shutil
+import concurrent.futures
+
 import pytest
+import numpy as np
 import pandas as pd
+
+import reporting
 from reporting import get_station_and_data, get_pollutant, daily_average, daily_median, hourly_average, monthly_average, peak_hour_date, count_missing_data, fill_missing_data
+from reporting import load_station, station_cache_path, group_matrix, resample_values, aggregate, batch_report
+from reporting import compute_daily_average, compute_monthly_average, compute_peak_hour, compute_missing_count, compute_filled_data
+from reporting import read_station_csv, iter_station_csv, stream_aggregate
+from reporting import build_cube, load_cube, open_cube, compute_gap_profile, gap_summary, batch_fill
+from reporting import compute_exceedances, batch_exceedances
+from reporting import compute_rolling_average, compute_rolling_max, rolling_average
+from reporting import compute_daily_peaks, compute_hourly_average, load_rollups, update_rollups, rollup_mean
 
 
 def test_get_station_and_data(monkeypatch):
@@ -17,6 +31,287 @@ def test_get_station_and_data(monkeypatch):
     assert station == "Harlington"
 
 
+def test_load_station():
+    """
+    Test the load_station function.
+
+    Checks that the station data is cleaned once with a datetime index and float pollutant columns,
+    and that repeated access returns the cached data frame.
+    """
+    data = load_station("M")
+    assert isinstance(data.index, pd.DatetimeIndex)
+    assert data.index[0] == pd.Timestamp("2021-01-01 00:00:00")
+    assert data.index[-1] == pd.Timestamp("2021-12-31 23:00:00")
+    assert all(data[p].dtype == np.float32 for p in ["no", "pm10", "pm25"])
+    assert data["pm25"].isna().any()
+    assert load_station("M") is data
+    with pytest.raises(KeyError):
+        load_station("X")
+
+
+def test_station_cache(monkeypatch, tmp_path):
+    """
+    Test the binary station cache.
+
+    Copies a station file into a temporary data directory, checks that the cache is built on first load
+    and matches the CSV file, and that it is rebuilt when the CSV file changes.
+    """
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    shutil.copy(os.path.join(reporting.data_directory, "Pollution-London Harlington.csv"), data_dir / "H.csv")
+    monkeypatch.setattr(reporting, "data_directory", str(data_dir))
+    monkeypatch.setattr(reporting, "cache_directory", str(tmp_path / "cache"))
+    monkeypatch.setitem(reporting.station_registry, "T", {"station": "Test", "file": "H.csv"})
+    load_station.cache_clear()
+
+    built = load_station("T")
+    assert os.path.exists(station_cache_path("T"))
+
+    load_station.cache_clear()
+    cached = load_station("T")
+    pd.testing.assert_frame_equal(built, cached)
+
+    # Changing the CSV file invalidates the cache
+    csv = (data_dir / "H.csv").read_text().replace("2021-01-01,01:00:00,1.43738", "2021-01-01,01:00:00,99.5")
+    (data_dir / "H.csv").write_text(csv)
+    os.utime(data_dir / "H.csv", ns=(0, 0))
+    load_station.cache_clear()
+    assert load_station("T")["no"].iloc[0] == np.float32(99.5)
+
+    # A cache file missing one of its arrays is rebuilt from the CSV file
+    with np.load(station_cache_path("T")) as cache:
+        arrays = {name: cache[name] for name in cache.files if name != "pm25"}
+    np.savez(station_cache_path("T"), **arrays)
+    load_station.cache_clear()
+    assert load_station("T")["pm25"].iloc[0] == np.float32(22.453)
+    with np.load(station_cache_path("T")) as cache:
+        assert "pm25" in cache.files
+    load_station.cache_clear()
+
+
+def test_resample_values():
+    """
+    Test the resample_values function.
+
+    Uses two years of hourly values including the 2020 leap day and a gap, and compares the daily, monthly and
+    hour of day results with pandas.
+    """
+    index = pd.date_range("2020-01-01", "2021-12-31 23:00", freq="h")
+    values = np.random.default_rng(0).random(len(index))
+    values[100:130] = np.nan
+    series = pd.Series(values, index=index)
+
+    labels, daily = resample_values(values, index, "D", "mean")
+    assert len(daily) == 731
+    assert labels[59] == np.datetime64("2020-02-29")
+    np.testing.assert_allclose(daily, series.resample("D").mean().to_numpy())
+
+    labels, monthly = resample_values(values, index, "M", "median")
+    assert len(monthly) == 24
+    np.testing.assert_allclose(monthly, series.resample("MS").median().to_numpy())
+
+    # Dropping hours leaves NaN padding but the same results
+    sparse = series.drop(series.index[5000:5010])
+    _, daily_sparse = resample_values(sparse.to_numpy(), sparse.index, "D", "max")
+    np.testing.assert_allclose(daily_sparse, sparse.resample("D").max().to_numpy())
+
+    labels, hourly = resample_values(values, index, "hour", "count")
+    assert list(labels) == list(range(24))
+    assert hourly.sum() == series.count()
+
+    with pytest.raises(ValueError):
+        resample_values(values, index, "W", "mean")
+    with pytest.raises(ValueError):
+        resample_values(values, index, "D", "mode")
+
+
+def test_group_matrix_is_view():
+    """
+    Test that complete days of contiguous hours are reshaped without copying.
+    """
+    index = pd.date_range("2021-01-01", periods=48, freq="h")
+    values = np.arange(48, dtype=np.float32)
+    labels, matrix = group_matrix(values, index, "D")
+    assert matrix.shape == (2, 24)
+    assert np.shares_memory(matrix, values)
+
+
+def test_aggregate():
+    """
+    Test the aggregate function.
+
+    Checks that every requested statistic is returned in one labelled table and agrees with resample_values.
+    """
+    table = aggregate("M", "pm25", "M", stats=["mean", "median", "min", "max", "count", "std", "p90", "p99"])
+    assert list(table.columns) == ["mean", "median", "min", "max", "count", "std", "p90", "p99"]
+    assert len(table) == 12
+    assert table.index.name == "date"
+
+    data = load_station("M")
+    _, median = resample_values(data["pm25"].to_numpy(), data.index, "M", "median")
+    np.testing.assert_allclose(table["median"].to_numpy(), median, rtol=1e-6)
+    assert (table["p90"] <= table["p99"]).all()
+    assert (table["min"] <= table["median"]).all() and (table["median"] <= table["max"]).all()
+    assert table["count"].sum() == data["pm25"].count()
+
+    hourly = aggregate(data, "no", "hour", stats=["mean"])
+    assert hourly.index.name == "hour" and len(hourly) == 24
+
+    # A data frame read straight from the CSV file, with 'No data' strings and a RangeIndex, gives the same table
+    raw = pd.read_csv(os.path.join(reporting.data_directory, "Pollution-London Marylebone Road.csv"))
+    daily = aggregate(raw, "no", "D", stats=["mean", "max"])
+    assert daily.index[0] == pd.Timestamp("2021-01-01") and len(daily) == 365
+    pd.testing.assert_frame_equal(daily, aggregate(data, "no", "D", stats=["mean", "max"]), check_dtype=False, rtol=1e-5)
+
+    with pytest.raises(ValueError):
+        aggregate("M", "pm25", "D", stats=["p101"])
+    with pytest.raises(ValueError):
+        aggregate("M", "so2", "D")
+
+
+def test_batch_report(tmp_path):
+    """
+    Test the batch_report function.
+
+    Runs all stations and pollutants across two worker processes and checks the merged report and output file.
+    """
+    output = tmp_path / "report.csv"
+    report = batch_report(freq="M", stats=["mean", "p95"], output_path=str(output), max_workers=2)
+    assert len(report) == 3 * 3 * 12
+    assert list(report.columns) == ["station", "pollutant", "date", "mean", "p95"]
+    assert set(report["station"]) == {"Harlington", "Marylebone Road", "N Kensington"}
+
+    saved = pd.read_csv(output)
+    assert len(saved) == len(report)
+
+    single = batch_report(stations=["M"], pollutants=["no"], freq="M", stats=["mean"], max_workers=1)
+    expected = report[(report["station"] == "Marylebone Road") & (report["pollutant"] == "no")]["mean"]
+    np.testing.assert_allclose(single["mean"].to_numpy(), expected.to_numpy())
+
+
+def test_compute_core(monkeypatch):
+    """
+    Test the non-interactive computational core.
+
+    Runs the core functions on the raw CSV data (with 'No data' strings) and on the loaded station data
+    without any prompts, and checks that both give the same results.
+    """
+    monkeypatch.setattr('builtins.input', lambda _: pytest.fail("The core must not prompt"))
+    raw = pd.read_csv(os.path.join(reporting.data_directory, "Pollution-London Marylebone Road.csv"))
+    data = load_station("M")
+
+    np.testing.assert_allclose(compute_daily_average(raw, "pm25"), compute_daily_average(data, "pm25"), rtol=1e-5)
+    assert len(compute_monthly_average(data, "no")) == 12
+    assert compute_missing_count(raw, "pm25") == compute_missing_count(data, "pm25") > 0
+    raw_peak, peak = compute_peak_hour(raw, "2021-06-01", "no"), compute_peak_hour(data, "2021-06-01", "no")
+    assert raw_peak[0] == peak[0] and raw_peak[1] == pytest.approx(peak[1], rel=1e-6)
+    assert compute_peak_hour(data, "2022-06-01", "no") is None
+    assert not compute_filled_data(data, "pm25", 0.0).isna().any()
+
+    # Only 'No data' is missing data, any other text in a column is an error
+    corrupt = raw.head(48).copy()
+    corrupt.loc[5, "no"] = "1,5"
+    with pytest.raises(ValueError, match="Invalid value in the no column"):
+        compute_missing_count(corrupt, "no")
+
+
+def test_compute_daily_peaks():
+    """
+    Test the compute_daily_peaks function.
+
+    Checks that the batch peaks of a date range agree with the peak of each single day.
+    """
+    data = load_station("M")
+    peaks = compute_daily_peaks(data, "pm25", "2021-03-01", "2021-03-31")
+    assert len(peaks) == 31
+    for date in ["2021-03-01", "2021-03-15", "2021-03-31"]:
+        peak = compute_peak_hour(data, date, "pm25")
+        row = peaks.loc[np.datetime64(date)]
+        if peak is None:
+            assert row["peak_hour"] is None and np.isnan(row["peak_value"])
+        else:
+            assert [row["peak_hour"], row["peak_value"]] == pytest.approx(peak)
+
+    assert len(compute_daily_peaks(data, "no")) == 365
+    assert compute_daily_peaks(data, "no").loc[np.datetime64("2021-01-01"), "peak_hour"] == compute_peak_hour(data, "2021-01-01", "no")[0]
+
+    # A frame with only a datetime index gets the same labels from both functions
+    indexed = data[["pm25"]]
+    for date in ["2021-03-01", "2021-03-15"]:
+        assert compute_peak_hour(indexed, date, "pm25") == compute_peak_hour(data, date, "pm25")
+        assert compute_peak_hour(indexed, date, "pm25")[0] == compute_daily_peaks(indexed, "pm25", date, date)["peak_hour"].iloc[0]
+
+    # A range without any rows gives an empty table
+    empty = compute_daily_peaks(data, "no", "2022-01-01", "2022-01-31")
+    assert len(empty) == 0 and list(empty.columns) == ["peak_hour", "peak_value"]
+
+
+def test_rollups(monkeypatch, tmp_path):
+    """
+    Test the station rollups.
+
+    Checks that the rollup answers agree with computing from the hourly rows, that copies or modified data are
+    not answered from the rollups, and that new hours are folded in incrementally without counting overlapping
+    hours twice and reach freshly loaded station data. The caches are written to a temporary directory.
+    """
+    monkeypatch.setattr(reporting, "cache_directory", str(tmp_path))
+    monkeypatch.setattr(reporting, "_rollups", {})
+    load_station.cache_clear()
+    try:
+        data = load_station("NK")
+        rollups = load_rollups("NK")
+        assert rollups["rows"] == len(data)
+        assert os.path.exists(tmp_path / "Pollution-London N Kensington.rollup.npz")
+
+        values, index = data["pm10"].to_numpy(), data.index
+        np.testing.assert_allclose(compute_daily_average(data, "pm10"), resample_values(values, index, "D", "mean")[1], rtol=1e-5)
+        np.testing.assert_allclose(compute_monthly_average(data, "pm10"), resample_values(values, index, "M", "mean")[1], rtol=1e-5)
+        np.testing.assert_allclose(compute_hourly_average(data, "pm10"), resample_values(values, index, "hour", "mean")[1], rtol=1e-5)
+        assert compute_missing_count(data, "pm10") == int(data["pm10"].isna().sum())
+
+        # A slice of the station data is not answered from the rollups of the whole station
+        assert len(compute_daily_average(data.iloc[:48], "pm10")) == 2
+
+        # Neither are copies or modified columns, although they carry the station key in attrs
+        scaled = data.copy()
+        scaled["pm10"] *= 10
+        np.testing.assert_allclose(compute_daily_average(scaled, "pm10"), 10 * compute_daily_average(data, "pm10"), rtol=1e-5)
+        assert compute_missing_count(data.assign(pm10=compute_filled_data(data, "pm10", 0.0)), "pm10") == 0
+
+        # The rollups answer in the dtype of the rows
+        for compute in (compute_daily_average, compute_monthly_average, compute_hourly_average):
+            assert compute(data, "pm10").dtype == compute(data.iloc[:-1], "pm10").dtype == data["pm10"].dtype
+        cube_file = str(tmp_path / "stations.cube")
+        assert load_cube(["NK"], cube_file).hours[-1] == np.datetime64(data.index[-1], 'h')
+
+        # Fold in two new days, the first of which overlaps the data already in the rollups;
+        # pm25 has no column and is counted as missing
+        new_index = pd.date_range("2021-12-31 00:00", "2022-01-01 23:00", freq="h")
+        new_data = pd.DataFrame({"no": 1.0, "pm10": 2.0}, index=new_index)
+        missing = compute_missing_count(data, "pm25")
+        updated = update_rollups("NK", new_data)
+        assert updated["rows"] == len(data) + 24
+        assert len(updated["day"]) == 366 and len(updated["month"]) == 13
+        assert rollup_mean(updated, "pm10", "day")[-1] == 2.0
+        assert rollup_mean(updated, "pm10", "day")[-2] == pytest.approx(compute_daily_average(data, "pm10")[-1])
+
+        # The old station data no longer matches the updated rollups and is computed from its rows,
+        # while freshly loaded station data includes the new hours and is answered from the rollups
+        assert len(compute_daily_average(data, "pm10")) == 365
+        fresh = load_station("NK")
+        assert len(fresh) == len(data) + 24 and fresh["time"].iloc[-1] == "24:00:00"
+        assert reporting._matching_rollups(fresh, "pm10") is updated
+        assert compute_daily_average(fresh, "pm10")[-1] == 2.0
+        assert compute_missing_count(fresh, "pm25") == missing + 24
+
+        # The cube notices the hours appended to the station cache and is rebuilt with them
+        cube = load_cube(["NK"], cube_file)
+        assert cube.hours[-1] == np.datetime64(fresh.index[-1], 'h')
+        assert gap_summary(cube)["missing"].tolist() == [compute_missing_count(fresh, p) for p in reporting.valid_pollutants]
+    finally:
+        load_station.cache_clear()
+
+
 def test_get_pollutant(monkeypatch):
     """
     Test the get_pollutant function.
@@ -125,3 +420,256 @@ def test_fill_missing_data(monkeypatch):
     assert not filled_data.isna().any()
 
 
+def test_rolling_average():
+    """
+    Test the rolling average functions.
+
+    Checks the running means against pandas' time-based rolling windows, also when hours are missing from the data.
+    """
+    data = load_station("NK")
+    expected = data["no"].astype(float).rolling(8, min_periods=6).mean().to_numpy()
+    np.testing.assert_allclose(compute_rolling_average(data, "no", 8), expected, rtol=1e-6, equal_nan=True)
+    assert len(rolling_average(data, "North Kensington", "no", 8)) == len(data)
+
+    gappy = data.drop(data.index[100:130])
+    expected = gappy["no"].astype(float).rolling("24h", min_periods=18).max().to_numpy()
+    np.testing.assert_allclose(compute_rolling_max(gappy, "no"), expected, equal_nan=True)
+
+
+def test_exceedances():
+    """
+    Test the exceedance functions.
+
+    Checks the episodes against the hours above the threshold, and that batching gives the same episodes.
+    """
+    data = load_station("M")
+    values = data["no"].to_numpy()
+    episodes = compute_exceedances(data, "no", 200)
+    assert episodes["duration"].sum() == np.count_nonzero(values > 200)
+    assert episodes["peak"].max() == pytest.approx(np.nanmax(values))
+    first = episodes.iloc[0]
+    hours = data.loc[first["start"]:first["end"], "no"]
+    assert len(hours) == first["duration"] and (hours > 200).all() and hours.max() == first["peak"]
+
+    daily = compute_exceedances(data, "pm25", 25, freq='D')
+    assert daily["duration"].sum() == np.count_nonzero(compute_daily_average(data, "pm25") > 25)
+
+    batch = batch_exceedances({"no": 200, "pm25": 25}, stations=["M", "NK"])
+    assert set(batch["station"]) <= {"Marylebone Road", "N Kensington"}
+    marylebone = batch[(batch["station"] == "Marylebone Road") & (batch["pollutant"] == "no")]
+    assert marylebone["duration"].tolist() == episodes["duration"].tolist()
+    assert len(compute_exceedances(data, "no", 1e9)) == 0
+    with pytest.raises(ValueError):
+        compute_exceedances(data, "no", 200, freq='M')
+
+
+def test_station_cube(tmp_path):
+    """
+    Test the memory-mapped station cube.
+
+    Checks that slices of the cube are views that match the station data, that the sidecar describes the cube,
+    and that load_cube reuses an up-to-date cube instead of rebuilding it.
+    """
+    path = str(tmp_path / "stations.cube")
+    cube = build_cube(["H", "M"], path)
+    assert cube.values.shape[:2] == (2, 3) and cube.stations == ["H", "M"]
+
+    data = load_station("M")
+    values = cube.select("pm25", "M", start=data.index[0], end=data.index[-1] + pd.Timedelta(hours=1))
+    np.testing.assert_array_equal(values, data["pm25"].to_numpy())
+    assert np.shares_memory(values, cube.values)
+    assert cube.select("no", start="2021-03-01", end="2021-03-02").shape == (2, 24)
+    assert cube.hours[0] == np.datetime64(data.index[0], 'h')
+
+    values_path = reporting._cube_values_path(path)
+    assert load_cube(["H", "M"], path).stations == ["H", "M"] and reporting._cube_values_path(path) == values_path
+
+    # A rebuild switches the sidecar to new values and removes the old ones
+    rebuilt = build_cube(["H", "M", "NK"], path)
+    assert rebuilt.values.shape[0] == 3 and open_cube(path).values.shape == rebuilt.values.shape
+    assert reporting._cube_values_path(path) != values_path and not os.path.exists(values_path)
+    np.testing.assert_array_equal(cube.select("pm25", "M"), rebuilt.select("pm25", "M"))
+
+    # Values that do not match the shape in the sidecar are not mapped
+    with open(reporting._cube_values_path(path), "r+b") as file:
+        file.truncate(1024)
+    with pytest.raises(ValueError):
+        open_cube(path)
+    with pytest.raises(ValueError):
+        cube.select("co")
+    with pytest.raises(ValueError):
+        open_cube(str(tmp_path / "missing.cube"))
+
+
+def test_concurrent_cube_builds(tmp_path):
+    """
+    Test that concurrent builds of one cube leave only the values named by the sidecar behind.
+    """
+    path = str(tmp_path / "stations.cube")
+    (tmp_path / "stations.cube.20200101000000000000-1").write_bytes(b"left by an interrupted build")
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        cubes = list(executor.map(lambda _: build_cube(["H", "M"], path), range(8)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        cubes += list(executor.map(lambda _: load_cube(["H", "M"], path), range(8)))
+
+    values_name = os.path.basename(reporting._cube_values_path(path))
+    assert sorted(os.listdir(tmp_path)) == sorted(["stations.cube.json", "stations.cube.lock", values_name])
+    np.testing.assert_array_equal(open_cube(path).select("no", "H"), load_station("H")["no"].to_numpy())
+
+
+def test_stream_aggregate(tmp_path):
+    """
+    Test the streaming CSV reader and aggregation.
+
+    Checks that the chunks add up to the whole file, that aggregating chunk by chunk (with days and months
+    split across chunks) gives the same tables as aggregate, and that it needs less memory than reading the file.
+    """
+    import tracemalloc
+
+    file_path = os.path.join(reporting.data_directory, reporting.station_registry["M"]["file"])
+    whole = read_station_csv(file_path)
+    chunks = list(iter_station_csv(file_path, chunk_rows=1000))
+    assert len(chunks) == -(-len(whole) // 1000)
+    pd.testing.assert_frame_equal(pd.concat(chunks), whole)
+
+    stats = ["mean", "sum", "count", "min", "max", "std"]
+    for freq in ["D", "M", "hour"]:
+        pd.testing.assert_frame_equal(stream_aggregate("M", "pm25", freq, stats, chunk_rows=1000),
+                                      aggregate(whole, "pm25", freq, stats), check_dtype=False, rtol=1e-5)
+
+    # Peak memory stays bounded when the file grows eight times longer, reading it whole does not
+    def peak(function, path):
+        tracemalloc.start()
+        function(path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    long_path = tmp_path / "long.csv"
+    lines = open(file_path).read().splitlines()
+    with open(long_path, "w") as file:
+        file.write(lines[0] + "\n")
+        for year in range(2001, 2009):
+            file.write("\n".join(line.replace("2021-", f"{year}-") for line in lines[1:]) + "\n")
+
+    stream = lambda path: stream_aggregate(str(path), "no", "D", ["mean"], chunk_rows=2000)
+    assert peak(stream, long_path) < 2 * peak(stream, file_path)
+    assert peak(stream, long_path) < peak(read_station_csv, long_path) / 3
+
+    with pytest.raises(ValueError):
+        stream_aggregate("M", "pm25", "D", ["median"])
+
+
+def test_call_memory():
+    """
+    Test that the station data is cleaned once and the core functions work on views of it.
+
+    Checks that the pollutant arrays of the loaded data are read-only and shared, that the interactive functions
+    leave the cached data unchanged, and the peak memory traced during each call against a budget measured
+    in columns (one column is all hours of one pollutant as float32).
+    """
+    import tracemalloc
+
+    data = load_station("M")
+    values = reporting.pollutant_values(data, "no")
+    assert np.shares_memory(values, reporting.pollutant_values(data, "no"))
+    with pytest.raises(ValueError):
+        values[0] = 1.0
+
+    before = data["no"].copy()
+    fill_missing_data(data, 0.0, "Marylebone", "no")
+    peak_hour_date(data, "2021-06-01", "Marylebone", "no")
+    pd.testing.assert_series_equal(data["no"], before)
+
+    column = len(data) * 4
+    budgets = [
+        (lambda: compute_daily_average(data, "no"), column / 2),
+        (lambda: compute_missing_count(data, "no"), column / 2),
+        (lambda: compute_peak_hour(data, "2021-06-01", "no"), column / 2),
+        (lambda: compute_filled_data(data, "no", 0.0), 4 * column),
+        (lambda: reporting.compute_daily_median(data, "no"), 8 * column),
+        (lambda: compute_daily_peaks(data, "no"), 8 * column),
+        (lambda: compute_rolling_average(data, "no", 8), 16 * column),
+    ]
+    for call, budget in budgets:
+        call()
+        tracemalloc.start()
+        call()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert peak < budget
+
+
+def test_gap_profile(tmp_path):
+    """
+    Test the gap profiler.
+
+    Checks that the missing hours per day, per month and per gap add up to the missing count, and that the
+    summary of all stations in the cube agrees with the profile of each station.
+    """
+    data = load_station("M")
+    profile = compute_gap_profile(data, "pm25")
+    assert profile["missing"] == compute_missing_count(data, "pm25") > 0
+    assert profile["per_day"].sum() == profile["per_month"].sum() == profile["gaps"]["duration"].sum() == profile["missing"]
+    assert len(profile["per_day"]) == 365 and len(profile["per_month"]) == 12
+    assert (profile["gap_lengths"].index * profile["gap_lengths"]).sum() == profile["missing"]
+    longest = profile["longest_gap"]
+    assert data.loc[longest["start"]:longest["end"], "pm25"].isna().all()
+    assert longest["duration"] == profile["gaps"]["duration"].max()
+    assert profile["capture"] == pytest.approx(100 * data["pm25"].notna().mean())
+
+    empty = compute_gap_profile(data.iloc[:0], "pm25")
+    assert empty["hours"] == empty["missing"] == 0 and empty["capture"] == 0.0
+    assert len(empty["per_day"]) == len(empty["per_month"]) == len(empty["gaps"]) == 0 and empty["longest_gap"] is None
+    empty_cube = reporting.StationCube(np.zeros((1, 3, 0), dtype=np.float32), ["M"], reporting.valid_pollutants, "2021-01-01")
+    assert gap_summary(empty_cube)["missing"].tolist() == [0, 0, 0]
+
+    summary = gap_summary(build_cube(["H", "M", "NK"], str(tmp_path / "stations.cube")))
+    assert len(summary) == 9
+    row = summary[(summary["station"] == "Marylebone Road") & (summary["pollutant"] == "pm25")].iloc[0]
+    assert row["missing"] == profile["missing"] and row["gaps"] == len(profile["gaps"])
+    assert row["longest_gap"] == longest["duration"] and row["longest_gap_start"] == longest["start"]
+
+
+def test_fill_methods():
+    """
+    Test the gap-filling methods of compute_filled_data and batch_fill.
+
+    Checks each method on a short series with known gaps, that max_gap leaves long gaps missing,
+    and the cross-station regression from N Kensington to Marylebone Road.
+    """
+    index = pd.date_range("2021-01-01", periods=8, freq="h", name="datetime")
+    data = pd.DataFrame({"no": [np.nan, 1.0, np.nan, 3.0, np.nan, np.nan, np.nan, 7.0]}, index=index)
+    fill = lambda method, **options: compute_filled_data(data, "no", method=method, **options).tolist()
+
+    assert fill("constant", new_value=0.0) == [0.0, 1.0, 0.0, 3.0, 0.0, 0.0, 0.0, 7.0]
+    assert fill("linear")[1:] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0] and np.isnan(fill("linear")[0])
+    assert fill("time", max_gap=1)[1:4] == [1.0, 2.0, 3.0] and np.isnan(fill("time", max_gap=1)[5])
+    assert fill("ffill")[1:] == [1.0, 1.0, 3.0, 3.0, 3.0, 3.0, 7.0]
+    assert fill("bfill") == [1.0, 1.0, 3.0, 3.0, 7.0, 7.0, 7.0, 7.0]
+
+    # Hours missing from the index count towards the gap length
+    assert fill("ffill", max_gap=2)[2] == 1.0 and np.isnan(fill("ffill", max_gap=2)[4])
+    gappy = compute_filled_data(data.drop(index[3]), "no", method="ffill", max_gap=2)
+    assert len(gappy) == 7 and np.isnan(gappy.iloc[2])
+
+    station = load_station("M")
+    climatology = compute_filled_data(station, "pm25", method="climatology")
+    assert not climatology.isna().any()
+    missing = station["pm25"].isna().to_numpy()
+    hourly = compute_hourly_average(station, "pm25")
+    np.testing.assert_allclose(climatology[missing], hourly[station.index[missing].hour], rtol=1e-5)
+
+    regression = compute_filled_data(station, "pm25", method="regression", reference="NK")
+    assert regression.isna().sum() < missing.sum()
+    pd.testing.assert_series_equal(regression[~missing], station["pm25"][~missing])
+
+    filled = batch_fill("regression", stations=["M"], references={"M": "NK"})
+    pd.testing.assert_series_equal(filled["M"]["pm25"], regression)
+    assert set(batch_fill("linear", max_gap=6)) == set(reporting.station_registry)
+    with pytest.raises(ValueError):
+        compute_filled_data(station, "pm25", method="spline")
+    with pytest.raises(ValueError):
+        batch_fill("regression", stations=["M"])
+
@@ -1,7 +1,15 @@
 # Test the utility functions
 
+import array
+
+import numpy as np
 import pytest
 from utils import sumvalues, maxvalue, minvalue, meanvalue, countvalue
+from utils import sumarray, maxarray, minarray, meanarray, countarray, describe
+from utils import SumAccumulator, MinAccumulator, MaxAccumulator, MeanAccumulator, CountAccumulator
+from utils import quantile, batched_quantile
+from utils import run_lengths
+from utils import rolling_mean, rolling_max, rolling_min, RollingWindow
 
 def test_sumvalues():
     assert sumvalues([1, 2, 3]) == 6
@@ -46,3 +54,179 @@ def test_countvalue():
         countvalue([], 1)
     with pytest.raises(ValueError):
         countvalue(['a', 2, 'b', 3, 'c'], 'a')
+
+
+def test_sumarray():
+    assert sumarray(np.array([1, 2, 3])) == 6
+    assert sumarray(array.array('d', [-1.0, 0.0, 1.0])) == 0
+    assert sumarray(memoryview(array.array('i', [1, 2, 3]))) == 6
+    assert np.isnan(sumarray(np.array([1.0, np.nan])))
+    assert sumarray(np.array([1.0, np.nan, 2.0]), skipna=True) == 3.0
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        sumarray(np.array([]))
+    with pytest.raises(ValueError):
+        sumarray(['a', 2, 3])
+    with pytest.raises(ValueError):
+        sumarray(np.array([np.nan, np.nan]), skipna=True)
+
+
+def test_maxarray():
+    assert maxarray(np.array([1, 2, 3])) == 3
+    assert maxarray(array.array('f', [-1, 0, 1])) == 1
+    assert maxarray(np.array([1.0, np.nan, 5.0]), skipna=True) == 5.0
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        maxarray([])
+    with pytest.raises(ValueError):
+        maxarray(np.array(['a', 'b']))
+
+
+def test_minarray():
+    assert minarray(np.array([1, 2, 3])) == 1
+    assert minarray(array.array('l', [-1, 0, 1])) == -1
+    assert minarray(np.array([1.0, np.nan, -5.0]), skipna=True) == -5.0
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        minarray([])
+    with pytest.raises(ValueError):
+        minarray([None, 1])
+
+
+def test_meanarray():
+    assert meanarray(np.array([1, 2, 3])) == 2
+    assert meanarray(np.array([-1, 0, 1], dtype=np.float32)) == 0
+    assert meanarray(np.array([1.0, np.nan, 3.0]), skipna=True) == 2.0
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        meanarray([])
+    with pytest.raises(ValueError):
+        meanarray(['a', 2, 3])
+
+
+def test_countarray():
+    assert countarray(np.array([1, 2, 2, 3, 2]), 2) == 3
+    assert countarray(array.array('d', [-1, 0, 1, 0, 0]), 0) == 3
+    assert countarray(np.array([1.0, np.nan, np.nan]), float('nan')) == 2
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        countarray([], 1)
+    with pytest.raises(ValueError):
+        countarray(['a', 2, 'b', 3, 'c'], 'a')
+    with pytest.raises(ValueError):
+        countarray(np.array([1, 2]), 'a')
+
+
+def test_describe():
+    stats = describe([1, 2, 2, 3, 2], xw=2)
+    assert stats == {"count": 5, "sum": 10, "min": 1, "max": 3, "mean": 2, "variance": 0.4, "occurrences": 3}
+
+    values = np.random.default_rng(1).normal(50, 10, 200_000)
+    values[::7] = np.nan
+    stats = describe(values, skipna=True)
+    valid = values[~np.isnan(values)]
+    assert stats["count"] == len(valid)
+    assert stats["sum"] == pytest.approx(valid.sum())
+    assert stats["mean"] == pytest.approx(valid.mean())
+    assert stats["variance"] == pytest.approx(valid.var())
+    assert stats["min"] == valid.min() and stats["max"] == valid.max()
+
+    big = np.tile([1.0, 7.0, np.nan, 7.0], 50_000)
+    assert describe(big, xw=7.0, skipna=True)["occurrences"] == 100_000
+    assert describe(big, xw=np.nan, skipna=True)["occurrences"] == 50_000
+
+    # Without skipna a NaN in any chunk makes every statistic NaN, like minarray and maxarray
+    for position in (0, 69_999):
+        values = np.ones(70_000)
+        values[position] = np.nan
+        stats = describe(values)
+        assert all(np.isnan(stats[key]) for key in ("sum", "min", "max", "mean", "variance"))
+
+    # Integers keep an exact int sum, like sumvalues
+    assert type(describe([1, 2, 3])["sum"]) is int
+    assert describe(np.arange(200_000))["sum"] == sum(range(200_000))
+
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        describe([])
+    with pytest.raises(ValueError, match="only contains NaN"):
+        describe(np.full(200_000, np.nan), skipna=True)
+    with pytest.raises(ValueError):
+        describe([1, 2, 3], xw="2")
+    with pytest.raises(ValueError):
+        describe(['a', 2, 3])
+
+
+def test_accumulators():
+    accumulators = [SumAccumulator(), MinAccumulator(), MaxAccumulator(), MeanAccumulator(), CountAccumulator(7)]
+    for accumulator in accumulators:
+        accumulator.consume(float(i % 50) for i in range(100_000))
+    total, minimum, maximum, mean, count = (accumulator.result for accumulator in accumulators)
+    assert (total, minimum, maximum, mean, count) == (2_450_000, 0, 49, 24.5, 2000)
+    assert accumulators[3].variance == pytest.approx(np.var(np.arange(50)))
+
+    # Accumulators filled from separate chunks merge to the result of the whole
+    values = np.random.default_rng(2).random(10_000)
+    left = MeanAccumulator().update(values[:3000])
+    right = MeanAccumulator().consume([values[3000:6000], values[6000:]])
+    assert left.merge(right).result == pytest.approx(values.mean())
+    assert left.variance == pytest.approx(values.var())
+    assert np.isnan(MaxAccumulator().update([1.0, np.nan]).update([3.0]).result)
+    assert MaxAccumulator(skipna=True).update([1.0, np.nan, 3.0]).result == 3.0
+
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        SumAccumulator().consume(iter([])).result
+    with pytest.raises(ValueError):
+        MinAccumulator().consume(['a', 2, 3])
+    with pytest.raises(ValueError):
+        SumAccumulator().merge(MinAccumulator())
+
+
+def test_quantile():
+    values = np.random.default_rng(3).normal(size=1001)
+    assert quantile(values, 0.5) == np.median(values)
+    np.testing.assert_allclose(quantile(values, [0.9, 0.95, 0.99]), np.percentile(values, [90, 95, 99]))
+    assert quantile([1, 2, 3, 4], 0.5) == 2.5
+    assert np.isnan(quantile([1.0, np.nan], 0.5))
+    assert quantile([1.0, np.nan, 3.0], 0.5, skipna=True) == 2.0
+    with pytest.raises(ValueError, match="The input list is empty, this operation cannot be performed."):
+        quantile([], 0.5)
+    with pytest.raises(ValueError):
+        quantile([1, 2], 1.5)
+
+
+def test_batched_quantile():
+    matrix = np.random.default_rng(4).random((365, 24))
+    matrix[matrix < 0.1] = np.nan
+    matrix[10] = np.nan
+    np.testing.assert_allclose(batched_quantile(matrix, 0.5), np.nanmedian(matrix, axis=1), equal_nan=True)
+    np.testing.assert_allclose(batched_quantile(matrix, [0.9, 0.99]), np.nanpercentile(matrix, [90, 99], axis=1), equal_nan=True)
+    assert np.isnan(batched_quantile(matrix, 0.5)[10])
+    with pytest.raises(ValueError):
+        batched_quantile([1, 2, 3], 0.5)
+
+
+def test_rolling():
+    import pandas as pd
+    values = np.random.default_rng(5).random(1000)
+    values[values < 0.2] = np.nan
+    series = pd.Series(values)
+    np.testing.assert_allclose(rolling_mean(values, 24), series.rolling(24, min_periods=18).mean(), equal_nan=True)
+    np.testing.assert_allclose(rolling_max(values, 8), series.rolling(8, min_periods=6).max(), equal_nan=True)
+    np.testing.assert_allclose(rolling_min(values, 8, min_count=1), series.rolling(8, min_periods=1).min(), equal_nan=True)
+    assert rolling_mean([1, 2, 3, 4], 2, min_count=1).tolist() == [1, 1.5, 2.5, 3.5]
+    with pytest.raises(ValueError):
+        rolling_mean([1, 2, 3], 0)
+    with pytest.raises(ValueError):
+        rolling_mean([1, 2, 3], 2, min_count=3)
+
+
+def test_rolling_window_stream():
+    rolling = RollingWindow(3, min_count=2)
+    results = [(r.mean, r.minimum, r.maximum) for r in (rolling.push(v) for v in [4.0, float("nan"), 2.0, 6.0, 1.0])]
+    assert np.isnan(results[0][0]) and np.isnan(results[1][0])
+    assert results[2:] == [(3.0, 2.0, 4.0), (4.0, 2.0, 6.0), (3.0, 1.0, 6.0)]
+
+
+def test_run_lengths():
+    starts, lengths = run_lengths([True, True, False, True, False, False, True])
+    assert starts.tolist() == [0, 3, 6] and lengths.tolist() == [2, 1, 1]
+    starts, lengths = run_lengths(np.zeros(5, dtype=bool))
+    assert len(starts) == len(lengths) == 0
+    with pytest.raises(ValueError):
+        run_lengths(np.ones((2, 2), dtype=bool))
+
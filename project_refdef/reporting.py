@@ -12,117 +12,1991 @@ import numpy as np
 import pandas as pd 
 import os 
 import datetime
+import functools
+import concurrent.futures
+import argparse
+import hashlib
+import json
+import warnings
+import contextlib
+import tempfile
+import re
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+from utils import batched_quantile, rolling_mean, rolling_max, run_lengths
 
 # Get the current directory of the script
 current_directory = os.path.dirname(os.path.abspath(__file__))
 
-# Define the data file names
-file_nameH = "Pollution-London Harlington.csv"
-file_nameM = "Pollution-London Marylebone Road.csv"
-file_nameNK = "Pollution-London N Kensington.csv"
-
-# Read the data frames from the data files in the 'data' directory
-file_pathH = os.path.join(current_directory, "data", file_nameH)
-file_pathM = os.path.join(current_directory, "data", file_nameM)
-file_pathNK = os.path.join(current_directory, "data", file_nameNK)
-
-dfH = pd.read_csv(file_pathH)
-dfM = pd.read_csv(file_pathM)
-dfNK = pd.read_csv(file_pathNK)
-
-# Map user inputs to dataframes and monitoring station names
-data_map = {
-    "H": {"df": dfH, "station": "Harlington"},
-    "M": {"df": dfM, "station": "Marylebone Road"},
-    "NK": {"df": dfNK, "station": "N Kensington"}
+# Locate the 'data' directory, either next to the script or one level up at the repository root
+data_directory = os.path.join(current_directory, "data")
+if not os.path.isdir(data_directory):
+    data_directory = os.path.join(os.path.dirname(current_directory), "data")
+
+# Binary cache of the cleaned station data, stored next to the 'data' directory
+cache_directory = os.path.join(os.path.dirname(data_directory), "cache")
+
+# Pollutant columns available in every station file
+valid_pollutants = ['no', 'pm10', 'pm25']
+
+# Map user inputs to monitoring station names and their data files.
+# The data frames themselves are only read when a station is first used (see load_station)
+station_registry = {
+    "H": {"station": "Harlington", "file": "Pollution-London Harlington.csv"},
+    "M": {"station": "Marylebone Road", "file": "Pollution-London Marylebone Road.csv"},
+    "NK": {"station": "N Kensington", "file": "Pollution-London N Kensington.csv"}
+}
+
+# Maximum number of cleaned station data frames kept in memory at the same time
+STATION_CACHE_SIZE = 8
+
+# Number of CSV rows parsed at a time by the streaming readers, which bounds their memory use
+CSV_CHUNK_ROWS = 1 << 16
+
+# The column types of the station CSV files, 'No data' entries are read as NaN
+csv_dtypes = {'date': str, 'time': str, 'no': np.float32, 'pm10': np.float32, 'pm25': np.float32}
+
+
+def register_station(station_key, station_name, file_name):
+    """
+    Adds a monitoring station to the station registry.
+
+    Parameters:
+    station_key (str): The key used to select the station, e.g. 'H'.
+    station_name (str): The name of the monitoring station.
+    file_name (str): The name of the station's CSV file in the 'data' directory.
+
+    Note:
+    Registering a station does not read its data file. If the key was already registered,
+    any cached data frame is discarded so the new file is read on next access.
+    """
+
+    if station_key in station_registry:
+        load_station.cache_clear()
+    station_registry[station_key] = {"station": station_name, "file": file_name}
+
+
+
+def _validate_stations(stations):
+    """
+    Returns the station keys as a list, all registered stations if stations is None.
+
+    Raises:
+    KeyError: If a station is not registered.
+    """
+
+    stations = list(station_registry) if stations is None else list(stations)
+    for station_key in stations:
+        if station_key not in station_registry:
+            raise KeyError(f"Invalid station {station_key}. Please use one of {', '.join(station_registry)}.")
+    return stations
+
+
+
+def read_station_csv(file_path):
+    """
+    Parses and cleans a station CSV file.
+
+    Parameters:
+    file_path (str): The path of the station's CSV file.
+
+    Returns:
+    data (DataFrame): A pandas DataFrame with float32 pollutant columns and a datetime index.
+
+    Note:
+    'No data' entries are converted to NaN while parsing.
+    The 'date' and 'time' columns are combined into a datetime index labelling the start of each
+    measured hour, so '2021-01-01 24:00:00' becomes '2021-01-01 23:00:00'.
+    """
+
+    return _index_station_rows(pd.read_csv(file_path, na_values=['No data'], dtype=csv_dtypes))
+
+
+
+def iter_station_csv(file_path, chunk_rows=None):
+    """
+    Parses and cleans a station CSV file in chunks of rows, so files larger than memory can be processed.
+
+    Parameters:
+    file_path (str): The path of the station's CSV file.
+    chunk_rows (int, optional): The number of rows per chunk. Defaults to CSV_CHUNK_ROWS.
+
+    Returns:
+    chunks (iterator of DataFrame): The rows of the file in order, cleaned as by read_station_csv.
+    """
+
+    chunk_rows = CSV_CHUNK_ROWS if chunk_rows is None else chunk_rows
+    with pd.read_csv(file_path, na_values=['No data'], dtype=csv_dtypes, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield _index_station_rows(chunk)
+
+
+
+def _index_station_rows(data):
+    """
+    Sets the datetime index of parsed station rows and returns them.
+    """
+
+    # The time column records the end of each hour (01:00:00 to 24:00:00)
+    data.index = pd.DatetimeIndex(pd.to_datetime(data['date']) + pd.to_timedelta(data['time']) - pd.Timedelta(hours=1), name='datetime').as_unit('ns')
+    return data
+
+
+
+def _file_digest(file_path):
+    """
+    Returns the SHA-1 hex digest of a file, read in 1 MiB blocks.
+    """
+
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+
+def _write_npz(path, arrays):
+    """
+    Writes arrays to an .npz file through a temporary file, so that readers never see a half written file.
+
+    Raises:
+    OSError: If the file cannot be written.
+    """
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+
+def station_cache_path(station_key):
+    """
+    Returns the path of the binary cache file of a monitoring station.
+
+    Parameters:
+    station_key (str): The key of the monitoring station in the station registry.
+
+    Returns:
+    path (str): The path of the station's .npz file in the cache directory.
+    """
+
+    file_name = station_registry[station_key]["file"]
+    return os.path.join(cache_directory, os.path.splitext(file_name)[0] + ".npz")
+
+
+
+def build_station_cache(station_key):
+    """
+    Parses a station CSV file and writes its cleaned columns to the binary cache.
+
+    Parameters:
+    station_key (str): The key of the monitoring station in the station registry.
+
+    Returns:
+    data (DataFrame): The cleaned station data that was written to the cache.
+
+    Note:
+    The cache stores the datetime64 index, the float32 pollutant columns, the original 'date' and 'time'
+    strings, and the modification time, size and SHA-1 digest of the source CSV file.
+    If the cache directory cannot be written, the parsed data is still returned.
+    """
+
+    file_path = os.path.join(data_directory, station_registry[station_key]["file"])
+    file_stat = os.stat(file_path)
+    data = read_station_csv(file_path)
+
+    columns = {pollutant: data[pollutant].to_numpy() for pollutant in valid_pollutants}
+    cache_path = station_cache_path(station_key)
+    digest = _file_digest(file_path)
+    data = _station_frame(data.index, data['date'].to_numpy(), data['time'].to_numpy(), columns)
+    data.attrs['source_digest'] = digest
+
+    try:
+        _write_npz(cache_path, dict(index=data.index.to_numpy(dtype='datetime64[ns]'),
+                                    date=data['date'].to_numpy(dtype=str),
+                                    time=data['time'].to_numpy(dtype=str),
+                                    source_mtime=np.int64(file_stat.st_mtime_ns),
+                                    source_size=np.int64(file_stat.st_size),
+                                    source_digest=np.array(digest),
+                                    **columns))
+    except OSError as err:
+        print(f"Could not write the station cache {cache_path}: {err}")
+
+    return data
+
+
+
+def _station_frame(index, date, time, columns):
+    """
+    Builds a station data frame that holds every pollutant as its own read-only float32 array.
+
+    The arrays are used as they are, without copying them into a consolidated block, and cannot be
+    modified through the data frame or through the arrays returned by pollutant_values.
+    """
+
+    frame = {'date': date, 'time': time}
+    for pollutant, values in columns.items():
+        values = np.asarray(values, dtype=np.float32)
+        values.flags.writeable = False
+        frame[pollutant] = values
+
+    return pd.DataFrame(frame, index=index, copy=False)
+
+
+
+def _read_station_cache(station_key):
+    """
+    Reads a station's data from the binary cache if it is still valid for the source CSV file.
+
+    Returns:
+    data (DataFrame): The cached station data, or None if the cache is missing or stale.
+
+    Note:
+    A cache whose recorded modification time or size differs from the source file is only
+    considered stale when the SHA-1 digest differs as well. If the digest still matches,
+    the recorded modification time is refreshed so the digest is not recomputed on every run.
+    """
+
+    file_path = os.path.join(data_directory, station_registry[station_key]["file"])
+    cache_path = station_cache_path(station_key)
+
+    if not os.path.exists(cache_path):
+        return None
+
+    file_stat = os.stat(file_path)
+
+    # A cache that cannot be read or misses any of its arrays is treated like a missing one
+    try:
+        with np.load(cache_path) as cache:
+            arrays = {name: cache[name] for name in cache.files}
+        source_mtime, source_size = int(arrays['source_mtime']), int(arrays['source_size'])
+        source_digest = str(arrays['source_digest'])
+        index, date, time = arrays['index'], arrays['date'], arrays['time']
+        columns = {pollutant: arrays[pollutant] for pollutant in valid_pollutants}
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if source_mtime != file_stat.st_mtime_ns or source_size != file_stat.st_size:
+        if source_digest != _file_digest(file_path):
+            return None
+
+        arrays['source_mtime'] = np.int64(file_stat.st_mtime_ns)
+        arrays['source_size'] = np.int64(file_stat.st_size)
+        try:
+            _write_npz(cache_path, arrays)
+        except OSError:
+            pass
+
+    data = _station_frame(pd.DatetimeIndex(index, name='datetime'), date, time, columns)
+    data.attrs['source_digest'] = source_digest
+
+    return data
+
+
+
+@functools.lru_cache(maxsize=STATION_CACHE_SIZE)
+def load_station(station_key):
+    """
+    Loads the cleaned data of a monitoring station on first access.
+
+    Parameters:
+    station_key (str): The key of the monitoring station in the station registry.
+
+    Returns:
+    data (DataFrame): A pandas DataFrame containing the station's pollutant data.
+
+    Raises:
+    KeyError: If the station key is not registered.
+
+    Note:
+    The data is read from the binary cache, which is rebuilt from the CSV file when it is missing or
+    the CSV file has changed (see build_station_cache). 'No data' entries are NaN and the pollutant
+    columns are float32.
+    The cleaned data frames are kept in a bounded LRU cache of STATION_CACHE_SIZE stations.
+    The station key and the SHA-1 digest of the CSV file are recorded in data.attrs.
+    """
+
+    data = _read_station_cache(station_key)
+    if data is None:
+        data = build_station_cache(station_key)
+    data.attrs['station_key'] = station_key
+
+    return data
+
+
+
+"""
+Rollups. For every station and pollutant the sums, valid counts and row counts of each day, month and
+hour of the day are computed once and persisted next to the station cache. Because these are additive,
+new hours are folded in incrementally, and the daily, monthly and hourly averages and the number of
+missing data points are answered from them without reading the hourly rows again.
+"""
+
+# Rollups of the stations loaded so far, by station key
+_rollups = {}
+
+
+
+def rollup_cache_path(station_key):
+    """
+    Returns the path of the rollup file of a monitoring station in the cache directory.
+    """
+
+    file_name = station_registry[station_key]["file"]
+    return os.path.join(cache_directory, os.path.splitext(file_name)[0] + ".rollup.npz")
+
+
+
+def _pad(array, length):
+    """
+    Returns the array extended with zeros to the given length.
+    """
+
+    return np.concatenate([array, np.zeros(length - len(array), dtype=array.dtype)])
+
+
+
+def _fold_hours(rollups, data):
+    """
+    Adds the hours of a data frame to the sums and counts of the rollups, extending the days and months as needed.
+    """
+
+    times = np.asarray(hour_index(data), dtype='datetime64[h]')
+    days = times.astype('datetime64[D]')
+    months = times.astype('datetime64[M]')
+
+    n_days = int((days.max() - rollups['day'][0]).astype(np.int64)) + 1
+    n_months = int((months.max() - rollups['month'][0]).astype(np.int64)) + 1
+    rollups['day'] = rollups['day'][0] + np.arange(max(n_days, len(rollups['day'])))
+    rollups['month'] = rollups['month'][0] + np.arange(max(n_months, len(rollups['month'])))
+
+    day_codes = (days - rollups['day'][0]).astype(np.int64)
+    month_codes = (months - rollups['month'][0]).astype(np.int64)
+    hour_codes = (times - days).astype(np.int64)
+
+    for pollutant in valid_pollutants:
+        # A pollutant the data has no column for is missing in all of its hours
+        values = pollutant_values(data, pollutant) if pollutant in data else np.full(len(times), np.nan)
+        valid = ~np.isnan(values)
+        weights = np.where(valid, values, 0.0)
+        groups = rollups[pollutant]
+
+        for period, codes, length in (('day', day_codes, len(rollups['day'])), ('month', month_codes, len(rollups['month'])), ('hour', hour_codes, 24)):
+            groups[period + '_sum'] = _pad(groups[period + '_sum'], length) + np.bincount(codes, weights=weights, minlength=length)
+            groups[period + '_count'] = _pad(groups[period + '_count'], length) + np.bincount(codes[valid], minlength=length)
+            groups[period + '_rows'] = _pad(groups[period + '_rows'], length) + np.bincount(codes, minlength=length)
+
+    rollups['rows'] += len(times)
+    rollups['last'] = max(rollups['last'], times.max())
+
+
+
+def build_rollups(station_key):
+    """
+    Computes the rollups of every pollutant of a station from its hourly data and persists them.
+
+    Parameters:
+    station_key (str): The key of the monitoring station in the station registry.
+
+    Returns:
+    rollups (dict): The station's rollups, see load_rollups.
+    """
+
+    data = load_station(station_key)
+    times = np.asarray(data.index, dtype='datetime64[h]')
+
+    rollups = {
+        'station_key': station_key,
+        'source_digest': data.attrs.get('source_digest', ''),
+        'first': times.min(),
+        'last': times.min(),
+        'rows': 0,
+        'day': np.array([times.min().astype('datetime64[D]')]),
+        'month': np.array([times.min().astype('datetime64[M]')]),
+    }
+    for pollutant in valid_pollutants:
+        rollups[pollutant] = {period + suffix: np.zeros(0, dtype=float if suffix == '_sum' else np.int64)
+                              for period in ('day', 'month', 'hour') for suffix in ('_sum', '_count', '_rows')}
+
+    _fold_hours(rollups, data)
+    _save_rollups(rollups)
+    return rollups
+
+
+
+def _save_rollups(rollups):
+    """
+    Writes the rollups of a station to its rollup file, ignoring an unwritable cache directory.
+    """
+
+    arrays = {key: np.asarray(value) for key, value in rollups.items() if key not in valid_pollutants}
+    for pollutant in valid_pollutants:
+        for name, array in rollups[pollutant].items():
+            arrays[f"{pollutant}.{name}"] = array
+
+    try:
+        _write_npz(rollup_cache_path(rollups['station_key']), arrays)
+    except OSError as err:
+        print(f"Could not write the rollups of station {rollups['station_key']}: {err}")
+
+
+
+def _read_rollups(station_key):
+    """
+    Reads the rollups of a station from its rollup file, or returns None if there is none.
+    """
+
+    path = rollup_cache_path(station_key)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path) as saved:
+            arrays = {name: saved[name] for name in saved.files}
+    except (OSError, ValueError):
+        return None
+
+    rollups = {'station_key': station_key, 'source_digest': str(arrays['source_digest']),
+               'first': arrays['first'][()], 'last': arrays['last'][()], 'rows': int(arrays['rows']),
+               'day': arrays['day'], 'month': arrays['month']}
+    for pollutant in valid_pollutants:
+        rollups[pollutant] = {name.split('.', 1)[1]: array for name, array in arrays.items() if name.startswith(pollutant + '.')}
+
+    return rollups
+
+
+
+def load_rollups(station_key):
+    """
+    Returns the rollups of a station, reading or building them on first access.
+
+    Parameters:
+    station_key (str): The key of the monitoring station in the station registry.
+
+    Returns:
+    rollups (dict): 'day' and 'month' labels, the 'first' and 'last' hour and the number of 'rows' covered,
+    and for every pollutant a dict of the '<period>_sum', '<period>_count' (valid values) and '<period>_rows'
+    arrays for the periods 'day', 'month' and 'hour' (of the day).
+
+    Note:
+    Rollups built from an older version of the station's CSV file are rebuilt.
+    """
+
+    data = load_station(station_key)
+    rollups = _rollups.get(station_key)
+
+    if rollups is None or rollups['source_digest'] != data.attrs.get('source_digest'):
+        rollups = _read_rollups(station_key)
+        if rollups is None or rollups['source_digest'] != data.attrs.get('source_digest'):
+            rollups = build_rollups(station_key)
+        _rollups[station_key] = rollups
+
+    return rollups
+
+
+
+def update_rollups(station_key, new_data):
+    """
+    Folds newly arrived hours of a station into its rollups and persists them.
+
+    Parameters:
+    station_key (str): The key of the monitoring station in the station registry.
+    new_data (DataFrame): The new hourly rows, with a datetime index (or 'date' and 'time' columns)
+    and the pollutant columns. Pollutants without a column are counted as missing in the new hours.
+
+    Returns:
+    rollups (dict): The updated rollups.
+
+    Note:
+    Only the hours after the last hour already in the rollups are added, so passing overlapping
+    data does not count any hour twice. Updating the rollups is proportional to the number of new hours.
+    The new hours are appended to the station cache as well, so the next load_station returns them
+    and is answered from the updated rollups.
+    """
+
+    rollups = load_rollups(station_key)
+
+    times = np.asarray(hour_index(new_data), dtype='datetime64[h]')
+    new_data = new_data[times > rollups['last']]
+
+    if len(new_data) > 0:
+        _fold_hours(rollups, new_data)
+        _save_rollups(rollups)
+        _append_station_cache(station_key, new_data)
+
+    return rollups
+
+
+
+def _append_station_cache(station_key, new_data):
+    """
+    Appends new hours to the binary cache of a station, so that load_station returns the same rows
+    as the updated rollups. The cache is still tied to the source CSV file: if that file changes,
+    the cache and the rollups are rebuilt from it and the appended hours are dropped.
+    """
+
+    data = load_station(station_key)
+    times = np.asarray(hour_index(new_data), dtype='datetime64[h]')
+
+    # The station files record the end of each hour, so the last hour of a day is '24:00:00'
+    hours = (times - times.astype('datetime64[D]')).astype(np.int64) + 1
+    columns = {pollutant: np.concatenate([pollutant_values(data, pollutant),
+                                          pollutant_values(new_data, pollutant).astype(np.float32) if pollutant in new_data
+                                          else np.full(len(times), np.nan, dtype=np.float32)])
+               for pollutant in valid_pollutants}
+
+    file_stat = os.stat(os.path.join(data_directory, station_registry[station_key]["file"]))
+    try:
+        _write_npz(station_cache_path(station_key),
+                   dict(index=np.concatenate([data.index.to_numpy(dtype='datetime64[ns]'), times.astype('datetime64[ns]')]),
+                        date=np.concatenate([data['date'].to_numpy(dtype=str), np.datetime_as_string(times.astype('datetime64[D]'))]),
+                        time=np.concatenate([data['time'].to_numpy(dtype=str), np.char.add(np.char.zfill(hours.astype(str), 2), ':00:00')]),
+                        source_mtime=np.int64(file_stat.st_mtime_ns),
+                        source_size=np.int64(file_stat.st_size),
+                        source_digest=np.array(data.attrs['source_digest']),
+                        **columns))
+    except OSError as err:
+        print(f"Could not write the station cache of {station_key}: {err}")
+
+    load_station.cache_clear()
+
+
+
+def rollup_mean(rollups, pollutant, period):
+    """
+    Returns the averages of a pollutant for every 'day', 'month' or 'hour' (of the day) of the rollups.
+
+    Periods without any valid value are NaN.
+    """
+
+    groups = rollups[pollutant]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return groups[period + '_sum'] / groups[period + '_count']
+
+
+
+def rollup_missing_count(rollups, pollutant):
+    """
+    Returns the number of missing data points of a pollutant covered by the rollups.
+    """
+
+    groups = rollups[pollutant]
+    return int(groups['hour_rows'].sum() - groups['hour_count'].sum())
+
+
+
+def _same_array(a, b):
+    """
+    Returns True if two arrays are the same memory, i.e. one is the other or a full view of it.
+    """
+
+    return (len(a) == len(b) and a.strides == b.strides
+            and a.__array_interface__['data'][0] == b.__array_interface__['data'][0])
+
+
+
+def _matching_rollups(data, pollutant):
+    """
+    Returns the rollups that cover exactly the rows of a pollutant of a station data frame, or None.
+
+    The rollups only answer for the cached, read-only arrays of load_station itself: the pollutant column
+    and the index of the data must be the very same memory as the station's. Copies, slices and modified
+    columns (e.g. data.copy() or data.assign(...)) are computed from their own rows.
+    """
+
+    station_key = data.attrs.get('station_key')
+    if station_key not in station_registry or pollutant not in valid_pollutants or len(data) == 0:
+        return None
+    if not isinstance(data.index, pd.DatetimeIndex) or not pd.api.types.is_float_dtype(data[pollutant].dtype):
+        return None
+
+    station = load_station(station_key)
+    if not _same_array(pollutant_values(data, pollutant), pollutant_values(station, pollutant)):
+        return None
+    if not _same_array(data.index.asi8, station.index.asi8):
+        return None
+
+    rollups = load_rollups(station_key)
+    if rollups['rows'] != len(station):
+        return None
+    if rollups['first'] != np.datetime64(station.index[0], 'h') or rollups['last'] != np.datetime64(station.index[-1], 'h'):
+        return None
+
+    return rollups
+
+
+
+"""
+Station cube. The cleaned values of all stations are kept in one memory-mapped float32 file laid out as
+[station, pollutant, hour], with NaN for missing values and a JSON sidecar that lists the stations, the
+pollutants and the first hour. Cross-station queries are slices of the mapped file, and every process that
+opens the cube shares the same pages of the operating system's file cache instead of parsing its own copy.
+"""
+
+# The path of the cube; its JSON sidecar is this path with a '.json' suffix and names the file of the values
+cube_path = os.path.join(cache_directory, "stations.cube")
+
+
+
+class StationCube:
+    """
+    A read-only view of the [station, pollutant, hour] cube.
+
+    Attributes:
+    values (memmap): The float32 cube, NaN for missing values.
+    stations (list of str): The station keys along the first axis.
+    pollutants (list of str): The pollutant keys along the second axis.
+    origin (datetime64): The hour of the first position along the third axis.
+    """
+
+    def __init__(self, values, stations, pollutants, origin):
+        self.values = values
+        self.stations = list(stations)
+        self.pollutants = list(pollutants)
+        self.origin = np.datetime64(origin, 'h')
+
+
+    @property
+    def hours(self):
+        """
+        The datetime64 hour of every position along the hour axis.
+        """
+        return self.origin + np.arange(self.values.shape[2])
+
+
+    def _hour_position(self, date):
+        # Dates before or after the cube are clipped to its first or last hour
+        position = int((np.datetime64(date, 'h') - self.origin).astype(np.int64))
+        return min(max(position, 0), self.values.shape[2])
+
+
+    def select(self, pollutant, station=None, start=None, end=None):
+        """
+        Returns the hourly values of a pollutant as a zero-copy view of the cube.
+
+        Parameters:
+        pollutant (str): The key of the pollutant.
+        station (str, optional): The key of a station. Defaults to all stations.
+        start (str or datetime64, optional): The first hour (or day), inclusive. Defaults to the first hour of the cube.
+        end (str or datetime64, optional): The hour (or day) where the values stop, exclusive. Defaults to the end of the cube.
+
+        Returns:
+        values (ndarray): A (stations, hours) view, or an (hours,) view when a station is given.
+
+        Raises:
+        ValueError: If the station or pollutant is not in the cube.
+        """
+
+        if pollutant not in self.pollutants:
+            raise ValueError(f"Invalid pollutant {pollutant}. Please use one of {', '.join(self.pollutants)}.")
+        if station is not None and station not in self.stations:
+            raise ValueError(f"Invalid station {station}. Please use one of {', '.join(self.stations)}.")
+
+        first = 0 if start is None else self._hour_position(start)
+        last = self.values.shape[2] if end is None else self._hour_position(end)
+        rows = slice(None) if station is None else self.stations.index(station)
+
+        return self.values[rows, self.pollutants.index(pollutant), first:last]
+
+
+
+def _cube_sources(stations):
+    """
+    Returns the file name, modification time and size of the source CSV file of every station, and the
+    number of rows and last hour of its data, which change when update_rollups appends hours to the cache.
+    """
+
+    sources = {}
+    for station_key in stations:
+        file_name = station_registry[station_key]["file"]
+        file_stat = os.stat(os.path.join(data_directory, file_name))
+        data = load_station(station_key)
+        sources[station_key] = {"file": file_name, "mtime_ns": file_stat.st_mtime_ns, "size": file_stat.st_size,
+                                "rows": len(data), "last_hour": str(data.index[-1]) if len(data) else None}
+    return sources
+
+
+
+def build_cube(stations=None, path=None):
+    """
+    Writes the cleaned values of several stations to a memory-mapped cube and its JSON sidecar.
+
+    Parameters:
+    stations (list of str, optional): Station keys from the station registry. Defaults to all registered stations.
+    path (str, optional): The path of the cube file. Defaults to cube_path in the cache directory.
+
+    Returns:
+    cube (StationCube): The cube, opened read-only.
+
+    Raises:
+    KeyError: If a station is not registered.
+
+    Note:
+    The hour axis runs from the first to the last hour of any station; hours a station does not cover are NaN.
+    Every build writes its values to a new file named after the build (e.g. 'stations.cube.<version>'), and
+    the sidecar at path + '.json' names that file. Replacing the sidecar is the single switch from the old
+    cube to the new one, so a reader always maps values that match the shape in the sidecar. Builds of the
+    same path run one at a time under a lock on path + '.lock', and each removes the values of every other
+    build afterwards; processes that have already mapped them keep their pages.
+    """
+
+    stations = _validate_stations(stations)
+    path = cube_path if path is None else path
+
+    with _cube_lock(path):
+        return _write_cube(stations, path)
+
+
+
+@contextlib.contextmanager
+def _cube_lock(path):
+    """
+    Holds an exclusive lock on path + '.lock', so that only one process at a time builds the cube at path.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".lock", "a+b") as file:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+        else:
+            # msvcrt only waits about ten seconds for a lock, so keep trying until the other build is done
+            file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+
+def _write_cube(stations, path):
+    """
+    Builds the cube of build_cube. The caller must hold the lock of _cube_lock.
+    """
+
+    sources = _cube_sources(stations)
+    hours = {key: np.asarray(load_station(key).index, dtype='datetime64[h]') for key in stations}
+    origin = min(times[0] for times in hours.values())
+    length = int((max(times[-1] for times in hours.values()) - origin).astype(np.int64)) + 1
+
+    version = datetime.datetime.now().strftime('%Y%m%d%H%M%S%f') + f"-{os.getpid()}"
+    values_path = f"{path}.{version}"
+    values = np.memmap(values_path, dtype=np.float32, mode='w+', shape=(len(stations), len(valid_pollutants), length))
+    values[:] = np.nan
+    for s, station_key in enumerate(stations):
+        data = load_station(station_key)
+        positions = (hours[station_key] - origin).astype(np.int64)
+        for p, pollutant in enumerate(valid_pollutants):
+            values[s, p, positions] = pollutant_values(data, pollutant)
+    values.flush()
+    del values
+
+    sidecar = {"file": os.path.basename(values_path), "stations": stations, "pollutants": list(valid_pollutants),
+               "origin": str(origin), "shape": [len(stations), len(valid_pollutants), length], "dtype": "float32",
+               "sources": sources}
+    descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".json.")
+    with os.fdopen(descriptor, "w") as file:
+        json.dump(sidecar, file, indent=1)
+    os.replace(temp_path, path + ".json")
+
+    # Remove the values of every other build, including ones left behind by builds that were interrupted
+    directory = os.path.dirname(path) or "."
+    pattern = re.compile(re.escape(os.path.basename(path)) + r"\.\d{20}-\d+")
+    for name in os.listdir(directory):
+        if pattern.fullmatch(name) and name != sidecar["file"]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    return open_cube(path)
+
+
+
+def _cube_values_path(path):
+    """
+    Returns the path of the values file named by the sidecar of a cube, or None if there is no readable sidecar.
+    """
+
+    try:
+        with open(path + ".json") as file:
+            return os.path.join(os.path.dirname(path), json.load(file)["file"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+
+def open_cube(path=None):
+    """
+    Opens an existing cube read-only without checking its sources.
+
+    Parameters:
+    path (str, optional): The path of the cube, whose sidecar is path + '.json'. Defaults to cube_path in the cache directory.
+
+    Returns:
+    cube (StationCube): The cube.
+
+    Raises:
+    ValueError: If the cube or its sidecar is missing, unreadable or of the wrong size.
+    """
+
+    path = cube_path if path is None else path
+
+    try:
+        with open(path + ".json") as file:
+            sidecar = json.load(file)
+        values_path = os.path.join(os.path.dirname(path), sidecar["file"])
+        shape, dtype = tuple(sidecar["shape"]), np.dtype(sidecar["dtype"])
+        size = os.path.getsize(values_path)
+    except (OSError, ValueError, KeyError, TypeError) as err:
+        raise ValueError(f"Could not open the station cube {path}: {err}")
+
+    if size != int(np.prod(shape)) * dtype.itemsize:
+        raise ValueError(f"The station cube {values_path} has {size} bytes, but its sidecar describes {shape} {dtype} values.")
+
+    values = np.memmap(values_path, dtype=dtype, mode='r', shape=shape)
+
+    return StationCube(values, sidecar["stations"], sidecar["pollutants"], sidecar["origin"])
+
+
+
+def load_cube(stations=None, path=None):
+    """
+    Opens the cube of several stations, rebuilding it when it is missing or its source CSV files or station data have changed.
+
+    Parameters:
+    stations (list of str, optional): Station keys from the station registry. Defaults to all registered stations.
+    path (str, optional): The path of the cube file. Defaults to cube_path in the cache directory.
+
+    Returns:
+    cube (StationCube): The cube, opened read-only.
+
+    Raises:
+    KeyError: If a station is not registered.
+    """
+
+    stations = _validate_stations(stations)
+    path = cube_path if path is None else path
+
+    if _cube_is_current(stations, path):
+        return open_cube(path)
+
+    # Another process may have rebuilt the cube while this one waited for the lock
+    with _cube_lock(path):
+        if _cube_is_current(stations, path):
+            return open_cube(path)
+        return _write_cube(stations, path)
+
+
+
+def _cube_is_current(stations, path):
+    """
+    Returns True if the cube at path holds the given stations and was built from their current sources.
+    """
+
+    try:
+        with open(path + ".json") as file:
+            sidecar = json.load(file)
+        return sidecar["stations"] == stations and sidecar["pollutants"] == valid_pollutants and sidecar["sources"] == _cube_sources(stations)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+
+print("Welcome to the reporting module. Here is the instruction.\n")
+
+print("1. Use the following keys to select data frame and monitoring station")
+print("[H] - Harlington\n[M] - Marylebone\n[NK] - N Kensington\n")
+print("2. Use the following keys to select pollutant")
+print("[no] - nitric oxide\n[pm10] - PM10 inhalable particulate matter\n[pm25] - PM2.5 inhalable particulate matter\n")
+
+print("***Note: If you enter the invalid key, you will be asked to repeat the process")
+
+
+def get_station_and_data():
+    """
+    Asks the user to input a key corresponding to a monitoring station.
+    The function checks the validity of the input, repeats the request until a valid input is received.
+
+    Returns:
+    data (DataFrame): A pandas DataFrame containing the data related to the chosen monitoring station.
+    monitoring_station (str): The name of the chosen monitoring station.
+
+    Note: 
+    The monitoring station options are: 
+    'H' for Harlington,
+    'M' for Marylebone,
+    'NK' for North Kensington.
+    """
+
+    print("\nPlease enter one of the following keys to select the monitoring station and data frame")
+    print("***If you enter the invalid key, you will be asked to repeat the process")
+    print("[H] - Harlington\n[M] - Marylebone\n[NK] - N Kensington")
+
+    valid_stations = list(station_registry)
+    while True:
+        station_input = input("Enter station here: ").upper()
+        if station_input not in valid_stations:
+            print(f"Invalid input {station_input}. Please enter H, M or NK.")
+        else:
+            break
+
+    data = load_station(station_input)
+    monitoring_station = station_registry[station_input]["station"]
+
+    return data, monitoring_station
+
+
+
+def get_pollutant():
+    """
+    Asks the user to input a key corresponding to a pollutant.
+    The function checks the validity of the input, repeats the request until a valid input is received.
+
+    Returns:
+    pollutant (str): The key of the chosen pollutant.
+
+    Note: 
+    The pollutant options are: 
+    'no' for nitric oxide,
+    'pm10' for PM10 inhalable particulate matter,
+    'pm25' for PM2.5 inhalable particulate matter.
+    """
+
+    print("\nPlease enter one of the following keys to select the pollutant")
+    print("***If you enter the invalid key, you will be asked to repeat the process")
+    print("[no] - nitric oxide\n[pm10] - PM10 inhalable particulate matter\n[pm25] - PM2.5 inhalable particulate matter\n")
+
+    while True:
+        pollutant = input("Enter pollutant here: ").lower()
+        if pollutant not in valid_pollutants:
+            print(f"Invalid input {pollutant}. Please enter no, pm10 or pm25.")
+        else:
+            break
+
+    return pollutant
+
+
+
+# Reducers available to the resampling engine. Each one ignores NaN and reduces the rows of a group matrix (axis 1)
+_reducers = {
+    "mean": np.nanmean,
+    "median": lambda matrix, axis: batched_quantile(matrix, 0.5),
+    "min": np.nanmin,
+    "max": np.nanmax,
+    "sum": np.nansum,
+    "std": np.nanstd,
+    "count": lambda matrix, axis: np.count_nonzero(~np.isnan(matrix), axis=axis),
 }
 
+# Supported resampling frequencies: daily, monthly, yearly and the hour of day profile
+valid_frequencies = ['D', 'M', 'Y', 'hour']
+
+
+
+def group_matrix(values, index, freq='D'):
+    """
+    Lays out hourly values as a matrix with one row per calendar group.
+
+    Parameters:
+    values (array-like): Hourly pollutant values, NaN for missing data.
+    index (DatetimeIndex or array-like of datetime64): The start of the hour of every value.
+    freq (str): 'D' for days, 'M' for months, 'Y' for years or 'hour' for the hour of the day.
+
+    Returns:
+    labels (ndarray): The label of every row, the first day/month/year of the group (datetime64)
+    or the hour of the day (0-23) for 'hour'.
+    matrix (ndarray): A 2D array with one row per group, padded with NaN where a group has fewer hours
+    than the widest group (e.g. February, or hours absent from the index).
+
+    Raises:
+    ValueError: If the frequency is not supported or values and index differ in length.
+
+    Note:
+    The groups follow the calendar of the index, so leap years and multi-year ranges are handled.
+    For daily groups over complete, contiguous hours starting at midnight the matrix is a
+    zero-copy reshape(-1, 24) view of the values.
+    """
+
+    if freq not in valid_frequencies:
+        raise ValueError(f"Invalid frequency {freq}. Please use one of {', '.join(valid_frequencies)}.")
+
+    values = np.asarray(values)
+    if not np.issubdtype(values.dtype, np.floating):
+        values = values.astype(np.float64)
+
+    times = np.asarray(index, dtype='datetime64[h]')
+    if len(times) != len(values):
+        raise ValueError("The values and the index must have the same length.")
+
+    if len(times) == 0:
+        return np.array([], dtype='datetime64[D]'), np.empty((0, 24), dtype=values.dtype)
+
+    days = times.astype('datetime64[D]')
+
+    # Fast path: complete days of contiguous hours
+    if freq == 'D' and len(times) % 24 == 0 and times[0] == days[0] and np.all(np.diff(times) == np.timedelta64(1, 'h')):
+        return days[::24], values.reshape(-1, 24)
+
+    if freq == 'D':
+        periods = days
+        width = 24
+    elif freq == 'M':
+        periods = times.astype('datetime64[M]')
+        width = 31 * 24
+    elif freq == 'Y':
+        periods = times.astype('datetime64[Y]')
+        width = 366 * 24
+
+    if freq == 'hour':
+        # Rows are the hours of the day, columns are the days
+        first = days.min()
+        rows = (times - days).astype(np.int64)
+        columns = (days - first).astype(np.int64)
+        labels = np.arange(24)
+        width = int(columns.max()) + 1
+    else:
+        first = periods.min()
+        rows = (periods - first).astype(np.int64)
+        columns = (times - periods.astype('datetime64[h]')).astype(np.int64)
+        labels = (first + np.arange(int(rows.max()) + 1)).astype('datetime64[D]')
+
+    matrix = np.full((len(labels), width), np.nan, dtype=values.dtype)
+    matrix[rows, columns] = values
+
+    return labels, matrix
+
+
+
+def resample_values(values, index, freq='D', stat='mean'):
+    """
+    Aggregates hourly values into calendar groups in a single vectorized pass.
+
+    Parameters:
+    values (array-like): Hourly pollutant values, NaN for missing data.
+    index (DatetimeIndex or array-like of datetime64): The start of the hour of every value.
+    freq (str): 'D' for days, 'M' for months, 'Y' for years or 'hour' for the hour of the day.
+    stat (str): One of 'mean', 'median', 'min', 'max', 'sum', 'std' or 'count'.
+
+    Returns:
+    labels (ndarray): The label of every group (see group_matrix).
+    result (ndarray): The statistic of every group, NaN for groups without any data.
+
+    Raises:
+    ValueError: If the frequency or the statistic is not supported.
+    """
+
+    if stat not in _reducers:
+        raise ValueError(f"Invalid statistic {stat}. Please use one of {', '.join(_reducers)}.")
+
+    labels, matrix = group_matrix(values, index, freq)
+
+    # All-NaN groups give NaN, the warning numpy raises for them is expected here
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        result = _reducers[stat](matrix, axis=1)
+
+    return labels, result
+
+
+
+def _percentile_of(stat):
+    """
+    Returns the percentile requested by a statistic name, e.g. 90.0 for 'p90' and 50.0 for 'median', or None.
+    """
+
+    if stat == "median":
+        return 50.0
+    if isinstance(stat, str) and stat.startswith("p"):
+        try:
+            q = float(stat[1:])
+        except ValueError:
+            return None
+        if 0 <= q <= 100:
+            return q
+    return None
+
+
+
+def aggregate(station, pollutant, freq='D', stats=("mean",)):
+    """
+    Computes several statistics of a pollutant for one calendar grouping in a single pass over the data.
+
+    Parameters:
+    station (str or DataFrame): The key of a monitoring station in the station registry, or pollutant data,
+    either loaded with load_station or read directly from a station CSV file (see pollutant_values and hour_index).
+    pollutant (str): The key of the pollutant.
+    freq (str): 'D' for days, 'M' for months, 'Y' for years or 'hour' for the hour of the day.
+    stats (iterable of str): Any of 'mean', 'median', 'min', 'max', 'sum', 'count', 'std'
+    and percentiles written as 'p<q>', e.g. 'p90' or 'p99.9'.
+
+    Returns:
+    table (DataFrame): One row per group, labelled by date (or hour of the day), and one column per statistic.
+
+    Raises:
+    ValueError: If the pollutant, frequency or a statistic is not supported.
+    KeyError: If the station key is not registered.
+
+    Note:
+    The pollutant column is laid out as a group matrix once (see group_matrix). The median and all
+    percentiles are selected together by a single utils.batched_quantile call on that matrix.
+    """
+
+    if pollutant not in valid_pollutants:
+        raise ValueError(f"Invalid pollutant {pollutant}. Please use one of {', '.join(valid_pollutants)}.")
+
+    stats = list(stats)
+    for stat in stats:
+        if stat not in _reducers and _percentile_of(stat) is None:
+            raise ValueError(f"Invalid statistic {stat}. Please use one of {', '.join(_reducers)} or p0 to p100.")
+
+    data = load_station(station) if isinstance(station, str) else station
+    labels, matrix = group_matrix(pollutant_values(data, pollutant), hour_index(data), freq)
+
+    columns = {}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        percentile_stats = [stat for stat in stats if _percentile_of(stat) is not None]
+        if percentile_stats:
+            qs = [_percentile_of(stat) / 100 for stat in percentile_stats]
+            for stat, result in zip(percentile_stats, batched_quantile(matrix, qs)):
+                columns[stat] = result
+
+        for stat in stats:
+            if stat not in columns:
+                columns[stat] = _reducers[stat](matrix, axis=1)
+
+    index_name = "hour" if freq == "hour" else "date"
+    return pd.DataFrame({stat: columns[stat] for stat in stats}, index=pd.Index(labels, name=index_name))
+
+
+
+def _station_report(station_key, station_entry, pollutants, freq, stats):
+    """
+    Computes the aggregate tables of every pollutant of one station. This is the batch_report worker.
+
+    Returns:
+    report (DataFrame): The tables of all pollutants stacked, with 'station' and 'pollutant' columns.
+    """
+
+    # Worker processes may not share registrations made at runtime in the parent process
+    if station_registry.get(station_key) != station_entry:
+        register_station(station_key, station_entry["station"], station_entry["file"])
+
+    data = load_station(station_key)
+
+    tables = []
+    for pollutant in pollutants:
+        table = aggregate(data, pollutant, freq, stats).reset_index()
+        table.insert(0, "pollutant", pollutant)
+        table.insert(0, "station", station_entry["station"])
+        tables.append(table)
+
+    return pd.concat(tables, ignore_index=True)
+
+
+
+def batch_report(stations=None, pollutants=None, freq='D', stats=("mean",), output_path=None, max_workers=None):
+    """
+    Computes aggregate statistics for every combination of stations and pollutants without any prompts.
+
+    Parameters:
+    stations (list of str, optional): Station keys from the station registry. Defaults to all registered stations.
+    pollutants (list of str, optional): Pollutant keys. Defaults to all pollutants.
+    freq (str): 'D' for days, 'M' for months, 'Y' for years or 'hour' for the hour of the day.
+    stats (iterable of str): The statistics to compute, as accepted by aggregate.
+    output_path (str, optional): If given, the merged report is written to this CSV file.
+    max_workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+    With a single worker, or a single station, the report is computed in the current process.
+
+    Returns:
+    report (DataFrame): One row per station, pollutant and group with one column per statistic.
+
+    Note:
+    Each station is handled by one worker process, which loads the station once and computes every
+    pollutant and statistic for it, so the work scales with the number of stations and cores.
+    """
+
+    stations = _validate_stations(stations)
+    pollutants = list(valid_pollutants) if pollutants is None else list(pollutants)
+    stats = list(stats)
+
+    jobs = [(station_key, station_registry[station_key], pollutants, freq, stats) for station_key in stations]
+
+    if max_workers == 1 or len(jobs) <= 1:
+        reports = [_station_report(*job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_station_report, *job) for job in jobs]
+            reports = [future.result() for future in futures]
+
+    report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame()
+
+    if output_path is not None:
+        report.to_csv(output_path, index=False)
+        print(f"The report of {len(stations)} stations and {len(pollutants)} pollutants is saved to {output_path}")
+
+    return report
+
+
+
+"""
+Streaming aggregation. The statistics that can be merged from partial results are computed chunk by chunk
+straight from the CSV file, so the memory used depends on the chunk size and the number of groups,
+not on the size of the file.
+"""
+
+# Statistics that stream_aggregate can compute from partial results
+streaming_stats = ['mean', 'sum', 'count', 'min', 'max', 'std']
+
+
+
+def _merge_group_moments(totals, labels, matrix, freq):
+    """
+    Merges the count, sum, mean, sum of squared deviations (M2), minimum and maximum of every row of a
+    group matrix into the running totals of the groups, extending the groups as needed.
+    """
+
+    # The groups are kept as a contiguous range of periods, like the labels of group_matrix
+    merged = np.union1d(totals['labels'], labels)
+    if freq != 'hour':
+        periods = merged.astype({'D': 'datetime64[D]', 'M': 'datetime64[M]', 'Y': 'datetime64[Y]'}[freq])
+        merged = np.arange(periods[0], periods[-1] + 1).astype('datetime64[D]')
+
+    if len(merged) != len(totals['labels']):
+        where = np.searchsorted(merged, totals['labels'])
+        for name, fill in (('count', 0), ('sum', 0.0), ('mean', 0.0), ('m2', 0.0), ('min', np.nan), ('max', np.nan)):
+            grown = np.full(len(merged), fill, dtype=totals[name].dtype)
+            grown[where] = totals[name]
+            totals[name] = grown
+        totals['labels'] = merged
+
+    rows = np.searchsorted(merged, labels)
+    count = np.count_nonzero(~np.isnan(matrix), axis=1)
+    total = np.nansum(matrix, axis=1, dtype=np.float64)
+    mean = np.divide(total, count, out=np.zeros(len(count)), where=count > 0)
+    m2 = np.nansum(np.square(matrix - mean[:, None], dtype=np.float64), axis=1)
+
+    # Parallel form of Welford's algorithm, as in utils._merge_moments, for all groups at once
+    count_a, mean_a = totals['count'][rows], totals['mean'][rows]
+    merged_count = count_a + count
+    delta = mean - mean_a
+    share = np.divide(count, merged_count, out=np.zeros(len(count)), where=merged_count > 0)
+    totals['mean'][rows] = mean_a + delta * share
+    totals['m2'][rows] += m2 + delta * delta * count_a * share
+    totals['count'][rows] = merged_count
+    totals['sum'][rows] += total
+    totals['min'][rows] = np.fmin(totals['min'][rows], np.nanmin(matrix, axis=1))
+    totals['max'][rows] = np.fmax(totals['max'][rows], np.nanmax(matrix, axis=1))
+
+
+
+def stream_aggregate(source, pollutant, freq='D', stats=("mean",), chunk_rows=None):
+    """
+    Computes statistics of a pollutant for one calendar grouping while reading a station CSV file in chunks.
+
+    Parameters:
+    source (str): The key of a monitoring station in the station registry, or the path of a station CSV file.
+    pollutant (str): The key of the pollutant.
+    freq (str): 'D' for days, 'M' for months, 'Y' for years or 'hour' for the hour of the day.
+    stats (iterable of str): Any of 'mean', 'sum', 'count', 'min', 'max' and 'std'.
+    chunk_rows (int, optional): The number of rows read at a time. Defaults to CSV_CHUNK_ROWS.
+
+    Returns:
+    table (DataFrame): The same table as aggregate, one row per group and one column per statistic.
+
+    Raises:
+    ValueError: If the pollutant, frequency or a statistic is not supported. The median and percentiles
+    cannot be merged from partial results, use aggregate for them.
+
+    Note:
+    Groups may span several chunks; their partial counts, sums and moments are merged exactly.
+    The CSV file is never held in memory as a whole and no station cache is written.
+    """
+
+    if pollutant not in valid_pollutants:
+        raise ValueError(f"Invalid pollutant {pollutant}. Please use one of {', '.join(valid_pollutants)}.")
+    if freq not in valid_frequencies:
+        raise ValueError(f"Invalid frequency {freq}. Please use one of {', '.join(valid_frequencies)}.")
+
+    stats = list(stats)
+    for stat in stats:
+        if stat not in streaming_stats:
+            raise ValueError(f"Invalid statistic {stat}. Please use one of {', '.join(streaming_stats)}.")
+
+    file_path = os.path.join(data_directory, station_registry[source]["file"]) if source in station_registry else source
+
+    totals = {'labels': np.array([], dtype=np.int64 if freq == 'hour' else 'datetime64[D]'),
+              'count': np.zeros(0, dtype=np.int64), 'sum': np.zeros(0), 'mean': np.zeros(0), 'm2': np.zeros(0),
+              'min': np.zeros(0), 'max': np.zeros(0)}
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+
+        for chunk in iter_station_csv(file_path, chunk_rows):
+            labels, matrix = group_matrix(chunk[pollutant].to_numpy(), chunk.index, freq)
+            _merge_group_moments(totals, labels, matrix, freq)
+
+        count = totals['count']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            columns = {'mean': np.where(count > 0, totals['mean'], np.nan), 'sum': totals['sum'], 'count': count,
+                       'min': totals['min'], 'max': totals['max'], 'std': np.sqrt(totals['m2'] / count)}
+
+    index_name = "hour" if freq == "hour" else "date"
+    return pd.DataFrame({stat: columns[stat] for stat in stats}, index=pd.Index(totals['labels'], name=index_name))
+
+
+
+"""
+Computational core. These functions take the data and parameters as arguments and return the results,
+without any prompts or prints, so they can be driven from a scheduler, a service or a benchmark.
+The interactive functions further below are thin wrappers over them.
+"""
+
+
+
+def pollutant_values(data, pollutant):
+    """
+    Returns the values of a pollutant column as a float array.
+
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data.
+    pollutant (str): The key of the pollutant.
+
+    Returns:
+    values (ndarray): The pollutant values, NaN for missing data.
+
+    Raises:
+    ValueError: If the column contains a value that is neither a number nor 'No data'.
+
+    Note:
+    Columns that still contain 'No data' strings (e.g. a data frame read directly with read_csv) are
+    converted to numbers, with 'No data' becoming NaN. Any other text is an error rather than missing data.
+    Float columns are returned as read-only views without copying them.
+    """
+
+    column = data[pollutant]
+    if not pd.api.types.is_float_dtype(column.dtype):
+        values = column.to_numpy(dtype=object)
+        missing = pd.isna(values) | (values == 'No data')
+        try:
+            return np.where(missing, np.nan, values).astype(np.float64)
+        except (TypeError, ValueError) as err:
+            raise ValueError(f"Invalid value in the {pollutant} column: {err}. Please make sure it only contains numbers and 'No data'.")
+
+    # A view of the column, which must not be modified through the returned array
+    values = column.to_numpy()
+    values.flags.writeable = False
+    return values
+
+
+
+def hour_index(data):
+    """
+    Returns the datetime index of the measured hours of a data frame.
+
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data.
+
+    Returns:
+    index (DatetimeIndex): The start of the hour of every row.
+
+    Note:
+    Data frames loaded with load_station already have this index. For other data frames
+    it is built from the 'date' and 'time' columns.
+    """
+
+    if isinstance(data.index, pd.DatetimeIndex):
+        return data.index
+    return pd.DatetimeIndex(pd.to_datetime(data['date']) + pd.to_timedelta(data['time']) - pd.Timedelta(hours=1))
+
+
+
+def compute_daily_average(data, pollutant):
+    """
+    Returns the daily averages of a pollutant as a NumPy array, one value per day of the data.
+    Station data returned by load_station is answered from the station's rollups, in the dtype of its column.
+    """
+
+    rollups = _matching_rollups(data, pollutant)
+    if rollups is not None:
+        return rollup_mean(rollups, pollutant, 'day').astype(data[pollutant].dtype)
+
+    return resample_values(pollutant_values(data, pollutant), hour_index(data), 'D', 'mean')[1]
+
+
+
+def compute_daily_median(data, pollutant):
+    """
+    Returns the daily medians of a pollutant as a NumPy array, one value per day of the data.
+    """
+
+    return resample_values(pollutant_values(data, pollutant), hour_index(data), 'D', 'median')[1]
+
+
+
+def compute_hourly_average(data, pollutant):
+    """
+    Returns the average of a pollutant for each hour of the day as a NumPy array of 24 values.
+    Station data returned by load_station is answered from the station's rollups, in the dtype of its column.
+    """
+
+    rollups = _matching_rollups(data, pollutant)
+    if rollups is not None:
+        return rollup_mean(rollups, pollutant, 'hour').astype(data[pollutant].dtype)
+
+    return resample_values(pollutant_values(data, pollutant), hour_index(data), 'hour', 'mean')[1]
+
+
+
+def compute_monthly_average(data, pollutant):
+    """
+    Returns the monthly averages of a pollutant as a NumPy array, one value per calendar month of the data.
+    Station data returned by load_station is answered from the station's rollups, in the dtype of its column.
+    """
+
+    rollups = _matching_rollups(data, pollutant)
+    if rollups is not None:
+        return rollup_mean(rollups, pollutant, 'month').astype(data[pollutant].dtype)
+
+    return resample_values(pollutant_values(data, pollutant), hour_index(data), 'M', 'mean')[1]
+
+
+
+def _on_hourly_grid(values, index, function):
+    """
+    Applies a rolling function to values placed on a gap-free hourly grid, so that a window always covers
+    the same number of hours even where rows are missing from the data, and returns the result for each row.
+    """
+
+    hours, grid, offsets = _hourly_grid(values, index)
+    return function(grid)[offsets]
+
+
+
+def _hourly_grid(values, index):
+    """
+    Places hourly values on a gap-free grid of hours, with NaN for the hours missing from the index.
+
+    Returns:
+    hours (ndarray): The datetime64 hour of every grid position.
+    grid (ndarray): The values on the grid, the values themselves when the index has no gaps.
+    offsets (ndarray or slice): The grid position of every value, a slice of the whole grid when the index has no gaps.
+    """
+
+    times = np.asarray(index, dtype='datetime64[h]')
+    if len(times) == 0:
+        return times, values, slice(None)
+
+    # A sorted index of distinct hours has no gaps when it spans as many hours as it has rows.
+    # The flags of a pandas index are cached, so station data is only checked once.
+    if isinstance(index, pd.Index):
+        distinct = index.is_monotonic_increasing and index.is_unique
+    else:
+        distinct = bool(np.all(times[1:] > times[:-1]))
+    if distinct and int((times[-1] - times[0]).astype(np.int64)) == len(times) - 1:
+        return times, values, slice(None)
+
+    first = times.min()
+    offsets = (times - first).astype(np.int64)
+    grid = np.full(offsets.max() + 1, np.nan)
+    grid[offsets] = values
+    return first + np.arange(len(grid)), grid, offsets
 
-print("Welcome to the reporting module. Here is the instruction.\n")
 
-print("1. Use the following keys to select data frame and monitoring station")
-print("[H] - Harlington\n[M] - Marylebone\n[NK] - N Kensington\n")
-print("2. Use the following keys to select pollutant")
-print("[no] - nitric oxide\n[pm10] - PM10 inhalable particulate matter\n[pm25] - PM2.5 inhalable particulate matter\n")
 
-print("***Note: If you enter the invalid key, you will be asked to repeat the process")
+def compute_rolling_average(data, pollutant, window=24, min_count=None):
+    """
+    Returns the running mean of a pollutant over the last window hours as a NumPy array, one value per row of the data,
+    e.g. window=8 for the 8-hour and window=24 for the 24-hour running means used for regulatory limits.
+    Windows with fewer than min_count measured hours (default 75% of the window) are NaN.
+    """
 
+    return _on_hourly_grid(pollutant_values(data, pollutant), hour_index(data),
+                           lambda values: rolling_mean(values, window, min_count))
 
-def get_station_and_data():
+
+
+def compute_rolling_max(data, pollutant, window=24, min_count=None):
     """
-    Asks the user to input a key corresponding to a monitoring station.
-    The function checks the validity of the input, repeats the request until a valid input is received.
+    Returns the running maximum of a pollutant over the last window hours as a NumPy array, one value per row of the data.
+    Windows with fewer than min_count measured hours (default 75% of the window) are NaN.
+    """
+
+    return _on_hourly_grid(pollutant_values(data, pollutant), hour_index(data),
+                           lambda values: rolling_max(values, window, min_count))
+
+
+
+def _day_slice(index, start_date, end_date=None):
+    """
+    Returns the slice of rows of a sorted datetime index from start_date up to the end of end_date.
+
+    The bounds are found with a binary search (searchsorted) instead of comparing every row.
+    end_date defaults to start_date, i.e. a single day.
+    """
+
+    start = np.datetime64(start_date, 'D')
+    end = np.datetime64(start_date if end_date is None else end_date, 'D') + np.timedelta64(1, 'D')
+    return slice(index.searchsorted(start), index.searchsorted(end))
+
+
+
+def compute_peak_hour(data, date, pollutant):
+    """
+    Returns the hour with the highest pollutant level on a date.
+
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data.
+    date (str): The date in the format yyyy-mm-dd.
+    pollutant (str): The key of the pollutant.
 
     Returns:
-    data (DataFrame): A pandas DataFrame containing the data related to the chosen monitoring station.
-    monitoring_station (str): The name of the chosen monitoring station.
+    peak (list): The peak hour (the 'time' string, e.g. '14:00:00') and the peak value,
+    or None if there is no data for the date. Frames with only a datetime index are labelled the same way.
 
-    Note: 
-    The monitoring station options are: 
-    'H' for Harlington,
-    'M' for Marylebone,
-    'NK' for North Kensington.
+    Note:
+    The rows of the date are found with a binary search on the sorted datetime index,
+    so only the 24 hours of that day are read.
     """
 
-    print("\nPlease enter one of the following keys to select the monitoring station and data frame")
-    print("***If you enter the invalid key, you will be asked to repeat the process")
-    print("[H] - Harlington\n[M] - Marylebone\n[NK] - N Kensington")
+    index = hour_index(data)
+    if not index.is_monotonic_increasing:
+        data = data.iloc[np.argsort(index.to_numpy(), kind='stable')]
+        index = hour_index(data)
 
-    valid_stations = ['H', 'M', 'NK']
-    while True:
-        station_input = input("Enter here: ").upper()
-        if station_input not in valid_stations:
-            print(f"Invalid input {station_input}. Please enter H, M or NK.")
-        else:
-            break
+    rows = _day_slice(index, date)
+    day_values = pollutant_values(data, pollutant)[rows]
+    if len(day_values) == 0 or np.isnan(day_values).all():
+        return None
+
+    # Like compute_daily_peaks, the label is built from the index: the hour starting at h ends at 'h+1:00:00'
+    position = rows.start + int(np.nanargmax(day_values))
+    return [f"{index[position].hour + 1:02d}:00:00", float(day_values[position - rows.start])]
 
-    data = data_map[station_input]["df"]
-    monitoring_station = data_map[station_input]["station"]
 
-    return data, monitoring_station
 
+def compute_daily_peaks(data, pollutant, start_date=None, end_date=None):
+    """
+    Returns the peak hour and peak value of every day in a date range.
 
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data, sorted by time.
+    pollutant (str): The key of the pollutant.
+    start_date (str, optional): The first date in the format yyyy-mm-dd. Defaults to the first day of the data.
+    end_date (str, optional): The last date in the format yyyy-mm-dd. Defaults to the last day of the data.
 
-def get_pollutant():
+    Returns:
+    peaks (DataFrame): One row per day, indexed by date, with the 'peak_hour' ('time' string, e.g. '14:00:00')
+    and the 'peak_value'. Days without any data have no peak hour and a NaN peak value.
+    The data frame is empty if no rows fall in the date range.
+
+    Note:
+    The days are laid out as a (days, 24) matrix (see group_matrix) and reduced with a single argmax.
     """
-    Asks the user to input a key corresponding to a pollutant.
-    The function checks the validity of the input, repeats the request until a valid input is received.
+
+    index = hour_index(data)
+    rows = slice(None)
+    if start_date is not None or end_date is not None:
+        first = start_date if start_date is not None else index[0]
+        last = end_date if end_date is not None else index[-1]
+        rows = _day_slice(index, first, last)
+
+    days, matrix = group_matrix(pollutant_values(data, pollutant)[rows], index[rows], 'D')
+    if len(days) == 0:
+        return pd.DataFrame({'peak_hour': np.array([], dtype=object), 'peak_value': np.array([], dtype=float)},
+                            index=pd.Index(days, name='date'))
+
+    # argmax does not skip NaN, so missing hours are ranked below every measured value
+    hours = np.argmax(np.where(np.isnan(matrix), -np.inf, matrix), axis=1)
+    values = matrix[np.arange(len(matrix)), hours]
+    has_data = ~np.isnan(matrix).all(axis=1)
+
+    # Hour h of the matrix is the hour ending at h+1, which the data records as 'h+1:00:00'
+    peak_hours = np.where(has_data, np.char.add(np.char.zfill((hours + 1).astype(str), 2), ':00:00'), None)
+
+    return pd.DataFrame({'peak_hour': peak_hours, 'peak_value': np.where(has_data, values, np.nan)},
+                        index=pd.Index(days, name='date'))
+
+
+
+def compute_exceedances(data, pollutant, threshold, freq='hour'):
+    """
+    Finds the episodes in which a pollutant stays above a threshold.
+
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data, sorted by time.
+    pollutant (str): The key of the pollutant.
+    threshold (int/float): The level a value must exceed to count as an exceedance.
+    freq (str): 'hour' to compare the hourly values or 'D' to compare the daily averages.
 
     Returns:
-    pollutant (str): The key of the chosen pollutant.
+    episodes (DataFrame): One row per episode with the 'start' and 'end' (the first and last hour or day
+    above the threshold), the 'peak' value and the 'duration' in hours or days.
+    The number of hours or days above the threshold is the sum of the durations.
 
-    Note: 
-    The pollutant options are: 
-    'no' for nitric oxide,
-    'pm10' for PM10 inhalable particulate matter,
-    'pm25' for PM2.5 inhalable particulate matter.
+    Raises:
+    ValueError: If the frequency is not 'hour' or 'D'.
+
+    Note:
+    Missing values are never exceedances, so they end an episode, and so do hours missing from the data.
+    The episodes are found with a run-length encoding of the exceedance mask, without a Python loop.
     """
 
-    print("\nPlease enter one of the following keys to select the pollutant")
-    print("***If you enter the invalid key, you will be asked to repeat the process")
-    print("[no] - nitric oxide\n[pm10] - PM10 inhalable particulate matter\n[pm25] - PM2.5 inhalable particulate matter\n")
+    if freq == 'hour':
+        labels, values, _ = _hourly_grid(pollutant_values(data, pollutant), hour_index(data))
+    elif freq == 'D':
+        labels, values = resample_values(pollutant_values(data, pollutant), hour_index(data), 'D', 'mean')
+    else:
+        raise ValueError(f"Invalid frequency {freq}. Please use 'hour' or 'D'.")
 
-    valid_pollutants = ['no', 'pm10', 'pm25']
-    while True:
-        pollutant = input("Enter here: ").lower()
-        if pollutant not in valid_pollutants:
-            print(f"Invalid input {pollutant}. Please enter no, pm10 or pm25.")
+    with np.errstate(invalid='ignore'):
+        starts, lengths = run_lengths(values > threshold)
+
+    # Reduce each episode on its own by interleaving the start and the end of every episode
+    bounds = np.column_stack([starts, starts + lengths]).ravel()
+    peaks = np.maximum.reduceat(np.append(values, np.nan), bounds)[::2] if len(starts) else np.array([])
+
+    return pd.DataFrame({'start': labels[starts], 'end': labels[starts + lengths - 1],
+                         'peak': peaks, 'duration': lengths})
+
+
+
+def batch_exceedances(thresholds, stations=None, freq='hour'):
+    """
+    Finds the exceedance episodes of several pollutants at several stations in one call.
+
+    Parameters:
+    thresholds (dict): The threshold of every pollutant to check, e.g. {'no': 200, 'pm25': 25}.
+    stations (list of str, optional): Station keys from the station registry. Defaults to all registered stations.
+    freq (str): 'hour' to compare the hourly values or 'D' to compare the daily averages.
+
+    Returns:
+    episodes (DataFrame): The episodes of compute_exceedances with 'station', 'pollutant' and 'threshold' columns.
+
+    Raises:
+    KeyError: If a station is not registered.
+    """
+
+    stations = _validate_stations(stations)
+
+    tables = []
+    for station_key in stations:
+        data = load_station(station_key)
+        for pollutant, threshold in thresholds.items():
+            table = compute_exceedances(data, pollutant, threshold, freq)
+            table.insert(0, "threshold", threshold)
+            table.insert(0, "pollutant", pollutant)
+            table.insert(0, "station", station_registry[station_key]["station"])
+            tables.append(table)
+
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+
+
+
+def compute_missing_count(data, pollutant):
+    """
+    Returns the number of missing data points ('No data' or NaN) of a pollutant as an int.
+    Station data returned by load_station is answered from the station's rollups.
+    """
+
+    rollups = _matching_rollups(data, pollutant)
+    if rollups is not None:
+        return rollup_missing_count(rollups, pollutant)
+
+    return int(np.isnan(pollutant_values(data, pollutant)).sum())
+
+
+
+def compute_gap_profile(data, pollutant):
+    """
+    Describes where the missing data points of a pollutant are.
+
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data, sorted by time.
+    pollutant (str): The key of the pollutant.
+
+    Returns:
+    profile (dict): With the keys
+    'hours' (int): The number of hours from the first to the last hour of the data.
+    'missing' (int): The number of missing hours.
+    'capture' (float): The percentage of hours with data.
+    'per_day' (Series): The number of missing hours of every day, indexed by date.
+    'per_month' (Series): The number of missing hours of every month, indexed by the first day of the month.
+    'gaps' (DataFrame): One row per run of missing hours with its 'start', 'end' and 'duration' in hours.
+    'gap_lengths' (Series): The number of gaps of every duration, indexed by the duration.
+    'longest_gap' (Series): The row of 'gaps' with the longest duration, or None if nothing is missing.
+
+    Note:
+    Hours missing from the data count as missing, like 'No data' entries. The gaps are found with a
+    run-length encoding of the NaN mask and the counts with bincount, without a Python loop.
+    """
+
+    hours, values, _ = _hourly_grid(pollutant_values(data, pollutant), hour_index(data))
+    missing = np.isnan(values)
+    starts, lengths = run_lengths(missing)
+
+    # Without any hours, the first day and month are taken from the epoch, and every count is empty
+    days = hours.astype('datetime64[D]')
+    months = hours.astype('datetime64[M]')
+    first_day = days[0] if len(days) else np.datetime64(0, 'D')
+    first_month = months[0] if len(months) else np.datetime64(0, 'M')
+    per_day = np.bincount((days - first_day).astype(np.int64), weights=missing).astype(np.int64)
+    per_month = np.bincount((months - first_month).astype(np.int64), weights=missing).astype(np.int64)
+
+    gaps = pd.DataFrame({'start': hours[starts], 'end': hours[starts + lengths - 1], 'duration': lengths})
+    durations, counts = np.unique(lengths, return_counts=True)
+
+    return {
+        'hours': len(values),
+        'missing': int(missing.sum()),
+        'capture': 100.0 * (1 - missing.sum() / len(values)) if len(values) else 0.0,
+        'per_day': pd.Series(per_day, index=pd.Index(first_day + np.arange(len(per_day)), name='date'), name='missing'),
+        'per_month': pd.Series(per_month, index=pd.Index((first_month + np.arange(len(per_month))).astype('datetime64[D]'), name='date'), name='missing'),
+        'gaps': gaps,
+        'gap_lengths': pd.Series(counts, index=pd.Index(durations, name='duration'), name='gaps'),
+        'longest_gap': gaps.iloc[int(np.argmax(lengths))] if len(lengths) else None,
+    }
+
+
+
+def gap_summary(cube=None):
+    """
+    Summarises the missing data of every station and pollutant in one pass over the station cube.
+
+    Parameters:
+    cube (StationCube, optional): The cube to summarise. Defaults to the cube of all registered stations (see load_cube).
+
+    Returns:
+    summary (DataFrame): One row per station and pollutant with the 'hours' of the cube, the 'missing' hours,
+    the data 'capture' in percent, the number of 'gaps', and the 'longest_gap' in hours with its 'longest_gap_start'.
+
+    Note:
+    The NaN masks of all stations and pollutants are laid end to end, separated by one measured hour,
+    and run-length encoded together, so the gaps of every series are found at once.
+    Hours of the cube that a station does not cover count as missing.
+    """
+
+    cube = load_cube() if cube is None else cube
+    n_stations, n_pollutants, n_hours = cube.values.shape
+    n_series = n_stations * n_pollutants
+
+    padded = np.zeros((n_series, n_hours + 1), dtype=bool)
+    padded[:, :n_hours] = np.isnan(cube.values).reshape(n_series, n_hours)
+    starts, lengths = run_lengths(padded.ravel())
+    series, offsets = np.divmod(starts, n_hours + 1)
+
+    missing = np.bincount(series, weights=lengths, minlength=n_series).astype(np.int64)
+    gaps = np.bincount(series, minlength=n_series)
+
+    # The longest gap of each series is the last of its gaps when sorted by series and length
+    order = np.lexsort((-offsets, lengths, series))
+    last = order[np.flatnonzero(np.diff(np.append(series[order], n_series)))]
+    longest = np.zeros(n_series, dtype=np.int64)
+    longest_start = np.full(n_series, np.datetime64('NaT'), dtype='datetime64[h]')
+    longest[series[last]] = lengths[last]
+    longest_start[series[last]] = cube.origin + offsets[last]
+
+    return pd.DataFrame({
+        'station': np.repeat([station_registry[key]["station"] if key in station_registry else key for key in cube.stations], n_pollutants),
+        'pollutant': np.tile(cube.pollutants, n_stations),
+        'hours': n_hours,
+        'missing': missing,
+        'capture': 100.0 * (1 - missing / n_hours) if n_hours else np.zeros(n_series),
+        'gaps': gaps,
+        'longest_gap': longest,
+        'longest_gap_start': longest_start.astype('datetime64[ns]'),
+    })
+
+
+
+# Strategies for filling missing data points, see compute_filled_data
+fill_methods = ['constant', 'linear', 'time', 'ffill', 'bfill', 'climatology', 'regression']
+
+
+
+def _fill_target(missing, max_gap):
+    """
+    Returns the mask of the missing hours to fill, leaving out the gaps longer than max_gap hours.
+    """
+
+    if max_gap is None:
+        return missing.copy()
+
+    starts, lengths = run_lengths(missing)
+    target = np.zeros(len(missing), dtype=bool)
+    target[np.flatnonzero(missing)] = np.repeat(lengths <= max_gap, lengths)
+    return target
+
+
+
+def _reference_grid(reference, pollutant, hours):
+    """
+    Returns the pollutant values of a reference station on the given hours, NaN where it has no data.
+    """
+
+    reference = load_station(reference) if isinstance(reference, str) else reference
+    positions = (np.asarray(hour_index(reference), dtype='datetime64[h]') - hours[0]).astype(np.int64)
+    inside = (positions >= 0) & (positions < len(hours))
+
+    grid = np.full(len(hours), np.nan)
+    grid[positions[inside]] = pollutant_values(reference, pollutant)[inside]
+    return grid
+
+
+
+def compute_filled_data(data, pollutant, new_value=None, method='constant', max_gap=None, reference=None):
+    """
+    Returns the pollutant data as a pandas Series with missing data points ('No data' or NaN) filled in.
+
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data, sorted by time.
+    pollutant (str): The key of the pollutant.
+    new_value (int/float, optional): The value that replaces every missing data point for the 'constant' method.
+    method (str): How the missing data points are filled:
+    'constant' with new_value,
+    'linear' or 'time' by linear interpolation between the hours around each gap,
+    'ffill' or 'bfill' with the last value before or the first value after each gap,
+    'climatology' with the average of the same hour of the day,
+    'regression' from a correlated reference station, with a least-squares line fitted on the hours both stations measured.
+    max_gap (int, optional): Gaps longer than this many hours are left missing. Defaults to filling every gap.
+    reference (str or DataFrame, optional): The reference station key or data for the 'regression' method.
+
+    Returns:
+    filled (Series): The filled pollutant values, indexed like the data. Hours that cannot be filled stay NaN,
+    e.g. before the first value for 'linear' and 'ffill', or where the reference has no data.
+
+    Raises:
+    ValueError: If the method is not supported, or the value or reference it needs is missing.
+
+    Note:
+    The values are placed on a gap-free hourly grid, so hours missing from the data count towards the length
+    of a gap and 'linear' and 'time' give the same result. Every method is vectorized over the whole series.
+    The station data itself is not modified.
+    """
+
+    if method not in fill_methods:
+        raise ValueError(f"Invalid method {method}. Please use one of {', '.join(fill_methods)}.")
+    if method == 'constant' and new_value is None:
+        raise ValueError("The 'constant' method needs a new_value.")
+    if method == 'regression' and reference is None:
+        raise ValueError("The 'regression' method needs a reference station.")
+
+    hours, values, offsets = _hourly_grid(pollutant_values(data, pollutant), hour_index(data))
+    missing = np.isnan(values)
+    target = _fill_target(missing, max_gap)
+    filled = np.array(values)
+
+    if method == 'constant':
+        filled[target] = new_value
+
+    elif method in ('linear', 'time'):
+        positions = np.flatnonzero(~missing)
+        if len(positions):
+            target[:positions[0]] = False
+            target[positions[-1] + 1:] = False
+            filled[target] = np.interp(np.flatnonzero(target), positions, values[positions])
+
+    elif method in ('ffill', 'bfill'):
+        positions = np.arange(len(values))
+        if method == 'ffill':
+            source = np.maximum.accumulate(np.where(missing, -1, positions))
+            target &= source >= 0
         else:
-            break
+            source = np.minimum.accumulate(np.where(missing, len(values), positions)[::-1])[::-1]
+            target &= source < len(values)
+        filled[target] = values[source[target]]
+
+    elif method == 'climatology':
+        hour_of_day = (hours - hours.astype('datetime64[D]')).astype(np.int64)
+        sums = np.bincount(hour_of_day, weights=np.where(missing, 0.0, values), minlength=24)
+        counts = np.bincount(hour_of_day[~missing], minlength=24)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            filled[target] = (sums / counts)[hour_of_day[target]]
+
+    elif method == 'regression':
+        predictor = _reference_grid(reference, pollutant, hours)
+        both = ~missing & ~np.isnan(predictor)
+        if np.count_nonzero(both) < 2:
+            raise ValueError("The reference station has fewer than two hours in common with the data.")
+        slope, intercept = np.polyfit(predictor[both], values[both], 1)
+        target &= ~np.isnan(predictor)
+        filled[target] = intercept + slope * predictor[target]
+
+    return pd.Series(filled[offsets], index=data.index, name=pollutant, copy=False)
+
+
+
+def batch_fill(method, stations=None, pollutants=None, new_value=None, max_gap=None, references=None):
+    """
+    Fills the missing data points of several stations and pollutants with one method.
+
+    Parameters:
+    method (str): One of fill_methods, see compute_filled_data.
+    stations (list of str, optional): Station keys from the station registry. Defaults to all registered stations.
+    pollutants (list of str, optional): Pollutant keys. Defaults to all pollutants.
+    new_value (int/float, optional): The value for the 'constant' method.
+    max_gap (int, optional): Gaps longer than this many hours are left missing.
+    references (dict, optional): The reference station key of every station for the 'regression' method,
+    e.g. {'M': 'NK'} to fill Marylebone Road from N Kensington.
+
+    Returns:
+    filled (dict): The filled data of every station key, a DataFrame with one column per pollutant.
+
+    Raises:
+    KeyError: If a station is not registered.
+    ValueError: If the method is not supported, or a station has no reference for the 'regression' method.
+    """
+
+    stations = _validate_stations(stations)
+    pollutants = list(valid_pollutants) if pollutants is None else list(pollutants)
+    references = {} if references is None else references
+
+    for station_key in stations:
+        if method == 'regression' and station_key not in references:
+            raise ValueError(f"No reference station for {station_key}. Please add it to the references.")
+
+    filled = {}
+    for station_key in stations:
+        data = load_station(station_key)
+        filled[station_key] = pd.DataFrame({pollutant: compute_filled_data(data, pollutant, new_value, method, max_gap, references.get(station_key))
+                                            for pollutant in pollutants}, index=data.index)
+    return filled
+
 
-    return pollutant
+
+"""
+Interactive functions. The station, pollutant, date and fill value are chosen with the prompts above
+(get_station_and_data, get_pollutant, get_user_date and get_fill_value) and passed in as arguments.
+"""
 
 
 
 def daily_average(data, monitoring_station, pollutant):
     """
     Calculates the daily average of the pollutant levels in a given monitoring station. 
-    The function asks the user to select a monitoring station and pollutant, 
-    and then computes the daily average of the pollutant levels.
 
     Parameters:
     data (DataFrame): A pandas DataFrame containing pollutant data.
-    monitoring_station (str): The key of the chosen monitoring station.
+    monitoring_station (str): The name of the chosen monitoring station.
     pollutant (str): The key of the chosen pollutant.
 
     Returns:
@@ -133,21 +2007,7 @@ def daily_average(data, monitoring_station, pollutant):
     which ignores 'No data' entries (converted to NaN) in the computation.
     """
 
-    data, monitoring_station = get_station_and_data()
-    pollutant = get_pollutant()
-
-    # Change 'No data' to np.nan for computational purposes
-    data = data.replace('No data', np.nan)
-
-    # Ensure that data type of the pollutant is float to prevent calculating errors
-    data[pollutant] = data[pollutant].astype(float)
-
-    # Convert pollutant data to list 
-    pollutant_list = data[pollutant].tolist()
-
-    # This comprehension create a new list where each element represents daily average value
-    # It also avoid the slice if of the missing data (This is to prevent errors in main menu)
-    average = [np.nanmean(pollutant_list[i:i+24]) for i in range(0, len(pollutant_list), 24) if len(pollutant_list[i:i+24]) > 0]
+    average = compute_daily_average(data, pollutant).tolist()
 
     print(f"\n[This is the average of {pollutant} in the {monitoring_station} station.]\n")
     return average
@@ -157,34 +2017,21 @@ def daily_average(data, monitoring_station, pollutant):
 def daily_median(data, monitoring_station, pollutant):
     """
     Calculates the daily median of the pollutant levels in a given monitoring station.
-    The function asks the user to select a monitoring station and pollutant, 
-    and then computes the daily median of the pollutant levels.
 
     Parameters:
     data (DataFrame): A pandas DataFrame containing pollutant data.
-    monitoring_station (str): The key of the chosen monitoring station.
+    monitoring_station (str): The name of the chosen monitoring station.
     pollutant (str): The key of the chosen pollutant.
 
     Returns:
     median (list): A list of daily median pollutant levels.
 
     Note:
-    The function uses numpy's nanmedian function to compute the median, 
+    The function selects the median of each day with utils.batched_quantile, 
     which ignores 'No data' entries (converted to NaN) in the computation.
     """
 
-    data, monitoring_station = get_station_and_data()
-    pollutant = get_pollutant()
-    
-    # This part of the code is the same as the daily_average function
-    data = data.replace('No data', np.nan)
-
-    data[pollutant] = data[pollutant].astype(float)
-
-    pollutant_list = data[pollutant].tolist()
-
-    # This comprehension create a new list where each element represents daily average value
-    median = [np.nanmedian(pollutant_list[i:i+24]) for i in range(0, len(pollutant_list), 24)]
+    median = compute_daily_median(data, pollutant).tolist()
 
     print(f"\n[This is the median of {pollutant} in the {monitoring_station} station.]\n") 
     return median
@@ -194,39 +2041,21 @@ def daily_median(data, monitoring_station, pollutant):
 def hourly_average(data, monitoring_station, pollutant):
     """
     Calculates the hourly average of the pollutant levels in a given monitoring station.
-    The function asks the user to select a monitoring station and pollutant, 
-    and then computes the hourly average of the pollutant levels.
 
     Parameters:
     data (DataFrame): A pandas DataFrame containing pollutant data.
-    monitoring_station (str): The key of the chosen monitoring station.
+    monitoring_station (str): The name of the chosen monitoring station.
     pollutant (str): The key of the chosen pollutant.
 
     Returns:
-    hourly (list): A list of hourly average pollutant levels.
+    hourly (list): A list of hourly average pollutant levels, 1:00:00 to 24:00:00.
 
     Note:
     The function uses numpy's nanmean function to compute the average, 
     which ignores 'No data' entries (converted to NaN) in the computation.
     """
 
-    data, monitoring_station = get_station_and_data()
-    pollutant = get_pollutant()
-    
-    # This part of the code is the same as the daily_average function
-    data = data.replace('No data', np.nan)
-
-    data[pollutant] = data[pollutant].astype(float)
-
-    pollutant_list = data[pollutant].tolist()
-
-    # Create 24 sublists, each of them represents each hour of the day 
-        # The 'list[start:stop:step]' create sublists by slicing, it starts at i and select every 24th element thereafter
-        # The range(24) specify an iterable from 0 to 23, which is 1:00:00 to 24:00:00 in this context 
-    pollutant_by_hour = [pollutant_list[i::24] for i in range(24)]
-
-    # Use numpy to calcultate average per each sublist (each hour)
-    hourly = [np.nanmean(hour_data) for hour_data in pollutant_by_hour]
+    hourly = compute_hourly_average(data, pollutant).tolist()
 
     print(f"\n[This is the hourly average of {pollutant} in the {monitoring_station} station.]\n")
     return hourly
@@ -236,12 +2065,10 @@ def hourly_average(data, monitoring_station, pollutant):
 def monthly_average(data, monitoring_station, pollutant):
     """
     Calculates the monthly average of the pollutant levels in a given monitoring station.
-    The function asks the user to select a monitoring station and pollutant, 
-    and then computes the monthly average of the pollutant levels.
 
     Parameters:
     data (DataFrame): A pandas DataFrame containing pollutant data.
-    monitoring_station (str): The key of the chosen monitoring station.
+    monitoring_station (str): The name of the chosen monitoring station.
     pollutant (str): The key of the chosen pollutant.
 
     Returns:
@@ -250,45 +2077,37 @@ def monthly_average(data, monitoring_station, pollutant):
     Note:
     The function uses numpy's nanmean function to compute the average, 
     which ignores 'No data' entries (converted to NaN) in the computation.
-    The function assumes the data covers a non-leap year, starting from January.
+    The months follow the calendar of the data's datetime index.
     """
 
-    data, monitoring_station = get_station_and_data()
-    pollutant = get_pollutant()
-    
-    # This part of the code is the same as the daily_average function
-    data = data.replace('No data', np.nan)
+    monthly = compute_monthly_average(data, pollutant).tolist()
 
-    data[pollutant] = data[pollutant].astype(float)
-
-    pollutant_list = data[pollutant].tolist()
+    print(f"\n[This is the monthly average of {pollutant} in the {monitoring_station} station.]\n")
+    return monthly
 
-    # Create list for numbers of days in months
-        # 2021 is not a leap year and there are exactly 8760 (24*365) data points. So, February is 28 days. 
-    days_in_months = [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
 
-    # Use an index to track where to start slicing data (for each month)
-    start = 0
 
-    # Create an empty list for storing pollutant data for each month (this list will contain 12 sublists)
-    pollutant_by_months = []
+def rolling_average(data, monitoring_station, pollutant, window=24):
+    """
+    Calculates the running average of the pollutant levels over the last window hours in a given monitoring station.
 
-    # Use month_days as a temporary variable for slicing data, resulting in 12 sublists of 12 months. 
-    for month_days in days_in_months:
-        month_data = pollutant_list[start:start + month_days*24]
+    Parameters:
+    data (DataFrame): A pandas DataFrame containing pollutant data.
+    monitoring_station (str): The name of the chosen monitoring station.
+    pollutant (str): The key of the chosen pollutant.
+    window (int, optional): The length of the window in hours, e.g. 8 or 24. Defaults to 24.
 
-        # Append the month_data to the list
-        pollutant_by_months.append(month_data)
+    Returns:
+    rolling (list): A list of running average pollutant levels, one for each hour of the data.
 
-        # Update the current starting index so that the new starting value (for new month) is the 
-        # first hour of the first day in that month
-        start += month_days*24
+    Note:
+    An hour's running average is NaN when fewer than 75% of the hours in its window were measured.
+    """
 
-    # Use numpy to calculate the average per each month
-    monthly = [np.nanmean(month) for month in pollutant_by_months]
+    rolling = compute_rolling_average(data, pollutant, window).tolist()
 
-    print(f"\n[This is the monthly average of {pollutant} in the {monitoring_station} station.]\n")
-    return monthly
+    print(f"\n[This is the {window}-hour running average of {pollutant} in the {monitoring_station} station.]\n")
+    return rolling
 
 
 
@@ -325,51 +2144,51 @@ def get_user_date():
 
 
 
-def peak_hour_date(data, monitoring_station, pollutant):
+def get_fill_value():
+    """
+    Prompts the user to enter the value used to replace missing data points.
+
+    The function repeatedly asks the user to input a value until an integer or float is entered.
+
+    Returns:
+    new_value (float): The valid user-input value.
+    """
+
+    print("Please make sure your new_value is integer or float")
+    while True:
+        new_value = input("Enter here: ")
+        try:
+            new_value = float(new_value)
+            break
+        except ValueError:
+            print(f"Invalid input {new_value}. Please make sure your new_value is an integer or float.")
+    return new_value
+
+
+
+def peak_hour_date(data, date, monitoring_station, pollutant):
     """
-    Returns the hour with the highest pollutant concentration for a user-specified date.
+    Returns the hour with the highest pollutant concentration for a specified date.
 
-    This function prompts the user to enter a date, filters the data for that date, and 
-    then identifies the hour with the highest concentration of the specified pollutant.
+    This function filters the data for the date, and then identifies the hour with 
+    the highest concentration of the specified pollutant.
 
     Args:
     data (pandas DataFrame): The DataFrame containing pollutant data.
+    date (str): The date in the format yyyy-mm-dd, e.g. from get_user_date.
     monitoring_station (str): The monitoring station.
     pollutant (str): The pollutant for which peak hour is to be found.
 
     Returns:
     peak (list): A list containing the peak hour and peak value. None, if no data is available.
-
-    Note:
-    The function converts the 'date' column into datetime format to enable date-based operations.
-    The function replaces 'No data' with np.nan and converts the pollutant data to float for computational purposes.
     """
 
-    date = get_user_date()
-
-    # Convert the 'date' column into the datetime format. This allows more complex date-based operations.
-    data['date'] = pd.to_datetime(data['date'])  
-    
-    # Change 'No data' to np.nan for computational purposes
-    data[pollutant] = data[pollutant].replace('No data', np.nan)
-
-    # Ensure that data type of the pollutant is float to prevent calculating errors
-    data[pollutant] = data[pollutant].astype(float)
+    peak = compute_peak_hour(data, date, pollutant)
 
-    # Filter the data for the specified date
-    data = data[data['date'].dt.strftime('%Y-%m-%d') == date]
-
-    if data.empty:
+    if peak is None:
         print(f"No data available for the date {date} at the {monitoring_station} station.")
         return None
 
-    # Get the hour with the highest pollution and its corresponding value
-    peak_hour = data.loc[data[pollutant].idxmax(), 'time'] 
-    peak_value = data[pollutant].max()
-
-    # Get the list containing the peak hour and peak value
-    peak = [peak_hour, peak_value]
-
     print(f"\n[This is the peak level of {pollutant} in the {monitoring_station} station on the date {date}.]\n")
     return peak
 
@@ -379,7 +2198,7 @@ def count_missing_data(data, monitoring_station, pollutant):
     """
     Returns the number of missing data points for a specified pollutant.
 
-    This function checks for the occurrence of 'No data' or NaN values in the pollutant data, and returns the sum.
+    This function counts the occurrence of 'No data' or NaN values in the pollutant data.
 
     Args:
     data (pandas DataFrame): The DataFrame containing pollutant data.
@@ -388,70 +2207,58 @@ def count_missing_data(data, monitoring_station, pollutant):
 
     Returns:
     count (int): The number of missing data points for the specified pollutant.
-
-    Note:
-    If 'No data' is not replaced with NaN yet, the function directly gets the sum of 'No data' occurrence.
-    If 'No data' is replaced with NaN, the function counts the sum of NaN occurrence.
     """
 
-    data, monitoring_station = get_station_and_data()
-    pollutant = get_pollutant()
-
-    pollutant_data = data[pollutant]
-
-    # Use conditional statements to prevent false result
-    if 'No data' in pollutant_data.values:
-        count = (pollutant_data == 'No data').sum()
-    else:
-        count = pollutant_data.isna().sum()
+    count = compute_missing_count(data, pollutant)
 
-    print("\nThe number of missing data is: " + count)
+    print(f"\nThe number of missing data of {pollutant} in the {monitoring_station} station is: {count}")
     return count
 
 
 
-def fill_missing_data(data, new_value, monitoring_station, pollutant):
+def fill_missing_data(data, new_value, monitoring_station, pollutant, method='constant', max_gap=None, reference=None):
     """
-    Replaces missing data points in a specified pollutant data with a user-input value.
+    Replaces missing data points in a specified pollutant data with a given value.
 
-    This function checks for the occurrence of 'No data' or NaN values in the pollutant data, and replaces them with the user-input value. 
+    This function replaces the occurrences of 'No data' or NaN values in the pollutant data with new_value,
+    or fills them with one of the other methods of compute_filled_data.
 
     Args:
     data (pandas DataFrame): The DataFrame containing pollutant data.
-    new_value (int or float): The value to replace missing data points with.
+    new_value (int or float): The value to replace missing data points with, e.g. from get_fill_value.
+    Only used by the 'constant' method.
     monitoring_station (str): The monitoring station.
     pollutant (str): The pollutant for which the missing data is to be replaced.
+    method (str, optional): 'constant', 'linear', 'time', 'ffill', 'bfill', 'climatology' or 'regression'.
+    max_gap (int, optional): Gaps longer than this many hours are left missing.
+    reference (str or DataFrame, optional): The reference station key or data for the 'regression' method.
 
     Returns:
     pollutant_data (pandas Series): The series of pollutant data with missing values replaced.
 
     Note:
-    If 'No data' is not replaced with NaN yet, the function directly replaces them with new_value.
-    If 'No data' is replaced with NaN, the function replaces NaN with the new_value.
-    If the user already replaced 'No data' or NaN with other eligible value, this function will not be able to replace any value.
+    The station data itself is not modified.
     """
 
-    data, monitoring_station = get_station_and_data()
-    pollutant = get_pollutant()
-
-    print("Please make sure your new_value is integer or float")
-    while True:
-        new_value = input("Enter here: ")
-        try:
-            new_value = float(new_value)
-            break
-        except ValueError:
-            print(f"Invalid input {new_value}. Please make sure your new_value is an integer or float.")
+    pollutant_data = compute_filled_data(data, pollutant, new_value, method, max_gap, reference)
 
-    pollutant_data = data[pollutant]
+    if method == 'constant':
+        print(f"\nThe {new_value} is now successfully replace the missing data of {pollutant} in the {monitoring_station} station\n")
+    else:
+        print(f"\nThe missing data of {pollutant} in the {monitoring_station} station is now filled with the {method} method\n")
+    return pollutant_data
 
-    # Use conditional statements to prevent false result
-    if 'No data' in pollutant_data.values:
-        pollutant_data = pollutant_data.replace('No data', new_value)
-    elif pollutant_data.isna().any():
-        pollutant_data = pollutant_data.fillna(new_value)
 
-    print("\nThe " + str(new_value) + "is now successfully replace the missing data\n")
-    return pollutant_data
 
+if __name__ == "__main__":
+    # Non-interactive batch mode, e.g. python reporting.py --freq M --stats mean p90 --output report.csv
+    parser = argparse.ArgumentParser(description="Compute pollutant statistics for all stations and pollutants.")
+    parser.add_argument("--stations", nargs="+", default=None, help="Station keys, defaults to all stations")
+    parser.add_argument("--pollutants", nargs="+", default=None, help="Pollutant keys, defaults to all pollutants")
+    parser.add_argument("--freq", default="D", choices=valid_frequencies, help="Grouping frequency")
+    parser.add_argument("--stats", nargs="+", default=["mean"], help="Statistics, e.g. mean median max p90")
+    parser.add_argument("--output", default="report.csv", help="Path of the merged CSV report")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
 
+    batch_report(args.stations, args.pollutants, args.freq, args.stats, args.output, args.workers)
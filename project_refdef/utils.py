@@ -1,3 +1,6 @@
+from collections import deque
+
+import numpy as np
 
 
 """
@@ -144,5 +147,806 @@ def countvalue(values, xw):
 
 
 
+"""
+The array functions below work on NumPy arrays, memoryviews, array.array objects or lists of numbers.
+Instead of checking every element, they check the dtype of the whole array once and then perform 
+the calculation in a single vectorized pass. They do not print their results. With skipna=True, 
+NaN values are ignored. Like the functions above, they raise ValueError for empty or non-numerical input.
+"""
+
+
+
+def _as_numeric_array(values):
+    """
+    Return the values as a one-dimensional numerical NumPy array without copying buffers where possible.
+
+    Raises:
+    ValueError: If there are no values or the values are not int or float.
+    """
+
+    try:
+        array = np.asarray(values)
+    except (TypeError, ValueError):
+        raise ValueError("Non-numerical value presented. Please make sure all items in your list/array are int and float.")
+
+    if array.size == 0:
+        raise ValueError("The input list is empty, this operation cannot be performed.")
+
+    # The dtype is checked once for the whole array: booleans, integers and floats are numerical
+    if array.dtype.kind not in "biuf":
+        raise ValueError(f"Non-numerical values presented (dtype {array.dtype}). Please make sure all items in your list/array are int and float.")
+
+    return array.ravel()
+
+
+
+def _check_not_all_nan(array, skipna):
+    """
+    Raise ValueError if NaN values are skipped and nothing else is left.
+    """
+
+    if skipna and array.dtype.kind == "f" and np.isnan(array).all():
+        raise ValueError("The input only contains NaN values, this operation cannot be performed.")
+
+
+
+def sumarray(values, skipna=False):
+    """
+    Calculate the sum of the values in an array.
+
+    Parameters:
+    values (array-like of int/float): A NumPy array, memoryview, array.array or list of numbers.
+    skipna (bool, optional): Ignore NaN values. Defaults to False.
+
+    Returns:
+    int/float: The sum of all values in the array.
+
+    Raises:
+    ValueError: If the array is empty, contains non-numerical values or, with skipna, only NaN values.
+    """
+
+    array = _as_numeric_array(values)
+    _check_not_all_nan(array, skipna)
+    return (np.nansum(array) if skipna else np.sum(array)).item()
+
+
+
+def maxarray(values, skipna=False):
+    """
+    Find the maximum value in an array.
+
+    Parameters:
+    values (array-like of int/float): A NumPy array, memoryview, array.array or list of numbers.
+    skipna (bool, optional): Ignore NaN values. Defaults to False.
+
+    Returns:
+    int/float: The maximum value in the array.
+
+    Raises:
+    ValueError: If the array is empty, contains non-numerical values or, with skipna, only NaN values.
+    """
+
+    array = _as_numeric_array(values)
+    _check_not_all_nan(array, skipna)
+    return (np.nanmax(array) if skipna else np.max(array)).item()
+
+
+
+def minarray(values, skipna=False):
+    """
+    Find the minimum value in an array.
+
+    Parameters:
+    values (array-like of int/float): A NumPy array, memoryview, array.array or list of numbers.
+    skipna (bool, optional): Ignore NaN values. Defaults to False.
+
+    Returns:
+    int/float: The minimum value in the array.
+
+    Raises:
+    ValueError: If the array is empty, contains non-numerical values or, with skipna, only NaN values.
+    """
+
+    array = _as_numeric_array(values)
+    _check_not_all_nan(array, skipna)
+    return (np.nanmin(array) if skipna else np.min(array)).item()
+
+
+
+def meanarray(values, skipna=False):
+    """
+    Calculate the mean of the values in an array.
+
+    Parameters:
+    values (array-like of int/float): A NumPy array, memoryview, array.array or list of numbers.
+    skipna (bool, optional): Ignore NaN values. Defaults to False.
+
+    Returns:
+    float: The mean of all values in the array.
+
+    Raises:
+    ValueError: If the array is empty, contains non-numerical values or, with skipna, only NaN values.
+    """
+
+    array = _as_numeric_array(values)
+    _check_not_all_nan(array, skipna)
+    return float(np.nanmean(array, dtype=np.float64) if skipna else np.mean(array, dtype=np.float64))
+
+
+
+def countarray(values, xw):
+    """
+    Count the occurrences of a value in an array.
+
+    Parameters:
+    values (array-like of int/float): A NumPy array, memoryview, array.array or list of numbers.
+    xw (int/float): The number to count occurrences of. NaN counts the NaN values.
+
+    Returns:
+    int: The count of the number in the array.
+
+    Raises:
+    ValueError: If the array is empty, or the array or xw are non-numerical.
+    """
+
+    array = _as_numeric_array(values)
+    if isinstance(xw, (str, bytes)) or not np.isscalar(xw):
+        raise ValueError(f"Non-numerical value presented: {xw}. Please make sure the value to count is int or float.")
+
+    if xw != xw:
+        return int(np.count_nonzero(np.isnan(array))) if array.dtype.kind == "f" else 0
+    return int(np.count_nonzero(array == xw))
+
+
+
+# Number of values reduced at a time by describe, which bounds the size of the temporary arrays
+DESCRIBE_CHUNK_SIZE = 1 << 16
+
+
+
+def _chunk_moments(chunk):
+    """
+    Return the count, sum, mean, sum of squared deviations (M2), minimum and maximum of a chunk of numbers.
+    """
+
+    count = len(chunk)
+    # Integers are summed exactly as Python ints, so the sum stays an int like the one of sumvalues
+    total = sum(chunk.tolist()) if chunk.dtype.kind in "iu" else float(np.sum(chunk, dtype=np.float64))
+    mean = total / count
+    m2 = float(np.sum(np.square(chunk - mean, dtype=np.float64)))
+    return count, total, mean, m2, chunk.min().item(), chunk.max().item()
+
+
+
+def _merge_moments(a, b):
+    """
+    Combine the moments of two chunks as if they had been computed over both together.
+
+    This is the parallel form of Welford's algorithm (Chan et al.), so the moments can be accumulated chunk by 
+    chunk, or computed separately by several workers, without losing precision in the variance.
+    """
+
+    if a is None:
+        return b
+    if b is None:
+        return a
+
+    count_a, total_a, mean_a, m2_a, min_a, max_a = a
+    count_b, total_b, mean_b, m2_b, min_b, max_b = b
+
+    count = count_a + count_b
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / count
+    m2 = m2_a + m2_b + delta * delta * count_a * count_b / count
+    # np.minimum and np.maximum keep NaN wherever it is, unlike min and max on Python floats
+    return count, total_a + total_b, mean, m2, np.minimum(min_a, min_b).item(), np.maximum(max_a, max_b).item()
+
+
+
+def describe(values, xw=None, skipna=False):
+    """
+    Calculate the sum, minimum, maximum, mean, count and variance of the values in a single pass.
+    
+    Parameters:
+    values (array-like of int/float): A list, NumPy array, memoryview or array.array of numbers.
+    xw (int/float, optional): If given, the number of occurrences of this number is counted as well.
+    skipna (bool, optional): Ignore NaN values. Defaults to False.
+
+    Returns:
+    dict: The 'count', 'sum', 'min', 'max', 'mean' and 'variance' (population variance) of the values,
+    and the number of 'occurrences' of xw if xw is given.
+
+    Raises:
+    ValueError: If the values are empty, contain non-numerical values or, with skipna, only NaN values.
+
+    Note:
+    The values are validated once and then read in a single pass, in chunks of DESCRIBE_CHUNK_SIZE: each chunk
+    is counted, cleared of NaN values and reduced before the next, and the chunks are combined with
+    Welford-style accumulation. This replaces calling sumvalues, maxvalue, minvalue, meanvalue and
+    countvalue one after another.
+    """
+
+    array = _as_numeric_array(values)
+
+    # The occurrences, the NaN values and the moments are all taken from the same chunk before moving on
+    occurrences = 0
+    moments = None
+    for start in range(0, len(array), DESCRIBE_CHUNK_SIZE):
+        chunk = array[start:start + DESCRIBE_CHUNK_SIZE]
+        if xw is not None:
+            occurrences += countarray(chunk, xw)
+        if skipna and chunk.dtype.kind == "f":
+            chunk = chunk[~np.isnan(chunk)]
+        if len(chunk) > 0:
+            moments = _merge_moments(moments, _chunk_moments(chunk))
+
+    # Only skipping NaN values can leave nothing to describe
+    if moments is None:
+        raise ValueError("The input only contains NaN values, this operation cannot be performed.")
+
+    count, total, mean, m2, minimum, maximum = moments
+    result = {"count": count, "sum": total, "min": minimum, "max": maximum, "mean": mean, "variance": m2 / count}
+    if xw is not None:
+        result["occurrences"] = occurrences
+    return result
+
+
+
+"""
+Accumulators reduce values that arrive one at a time or in chunks, e.g. read from a file or an API, in 
+constant memory. Each accumulator is fed with update() (one number or one chunk) or consume() (an iterable 
+of numbers and/or chunks), and accumulators filled by different workers can be combined with merge(). 
+The chunks are validated like the array functions above.
+"""
+
+
+
+class Accumulator:
+    """
+    Base class of the streaming accumulators.
+
+    Subclasses implement _update_chunk(array) and _merge_state(other), and the result property.
+
+    Parameters:
+    skipna (bool, optional): Ignore NaN values. Defaults to False.
+    """
+
+    def __init__(self, skipna=False):
+        self.skipna = skipna
+        self.count = 0
+
+
+    def update(self, values):
+        """
+        Add a number or a chunk (list, NumPy array, memoryview or array.array) of numbers.
+
+        Returns:
+        The accumulator itself.
+
+        Raises:
+        ValueError: If the chunk contains non-numerical values.
+        """
+
+        if np.size(values) == 0:
+            return self
+
+        array = _as_numeric_array(values)
+        if self.skipna and array.dtype.kind == "f":
+            array = array[~np.isnan(array)]
+
+        if len(array) > 0:
+            self._update_chunk(array)
+            self.count += len(array)
+        return self
+
+
+    def consume(self, iterable, chunk_size=DESCRIBE_CHUNK_SIZE):
+        """
+        Add every number or chunk of an iterable, e.g. a generator. Single numbers are buffered into chunks of chunk_size.
+
+        Returns:
+        The accumulator itself.
+        """
+
+        buffer = []
+        for item in iterable:
+            if np.isscalar(item):
+                buffer.append(item)
+                if len(buffer) == chunk_size:
+                    self.update(buffer)
+                    buffer = []
+            else:
+                self.update(buffer)
+                buffer = []
+                self.update(item)
+
+        self.update(buffer)
+        return self
+
+
+    def merge(self, other):
+        """
+        Combine the values of another accumulator of the same kind into this one.
+
+        Returns:
+        The accumulator itself.
+
+        Raises:
+        ValueError: If the other accumulator is of a different kind.
+        """
+
+        if type(other) is not type(self):
+            raise ValueError(f"Cannot merge {type(other).__name__} into {type(self).__name__}.")
+
+        if other.count > 0:
+            self._merge_state(other)
+            self.count += other.count
+        return self
+
+
+    def _check_not_empty(self):
+        if self.count == 0:
+            raise ValueError("The input list is empty, this operation cannot be performed.")
+
+
+
+class SumAccumulator(Accumulator):
+    """
+    Accumulates the sum of the values.
+    """
+
+    def __init__(self, skipna=False):
+        super().__init__(skipna)
+        self.total = 0
+
+
+    def _update_chunk(self, array):
+        self.total += np.sum(array).item()
+
+
+    def _merge_state(self, other):
+        self.total += other.total
+
+
+    @property
+    def result(self):
+        self._check_not_empty()
+        return self.total
+
+
+
+class MinAccumulator(Accumulator):
+    """
+    Accumulates the minimum value.
+    """
+
+    def __init__(self, skipna=False):
+        super().__init__(skipna)
+        self.minimum = None
+
+
+    def _update_chunk(self, array):
+        # np.minimum keeps NaN, like the minimum of a chunk that contains NaN
+        chunk_min = array.min().item()
+        self.minimum = chunk_min if self.minimum is None else np.minimum(self.minimum, chunk_min).item()
+
+
+    def _merge_state(self, other):
+        self._update_chunk(np.array([other.minimum]))
+
+
+    @property
+    def result(self):
+        self._check_not_empty()
+        return self.minimum
+
+
+
+class MaxAccumulator(Accumulator):
+    """
+    Accumulates the maximum value.
+    """
+
+    def __init__(self, skipna=False):
+        super().__init__(skipna)
+        self.maximum = None
+
+
+    def _update_chunk(self, array):
+        chunk_max = array.max().item()
+        self.maximum = chunk_max if self.maximum is None else np.maximum(self.maximum, chunk_max).item()
+
+
+    def _merge_state(self, other):
+        self._update_chunk(np.array([other.maximum]))
+
+
+    @property
+    def result(self):
+        self._check_not_empty()
+        return self.maximum
+
+
+
+class MeanAccumulator(Accumulator):
+    """
+    Accumulates the mean and the (population) variance of the values with Welford-style updates.
+    """
+
+    def __init__(self, skipna=False):
+        super().__init__(skipna)
+        self.moments = None
+
+
+    def _update_chunk(self, array):
+        self.moments = _merge_moments(self.moments, _chunk_moments(array))
+
+
+    def _merge_state(self, other):
+        self.moments = _merge_moments(self.moments, other.moments)
+
+
+    @property
+    def result(self):
+        self._check_not_empty()
+        return self.moments[2]
+
+
+    @property
+    def variance(self):
+        self._check_not_empty()
+        return self.moments[3] / self.moments[0]
+
+
+
+class CountAccumulator(Accumulator):
+    """
+    Accumulates the number of occurrences of a value.
+
+    Parameters:
+    xw (int/float): The number to count occurrences of. NaN counts the NaN values.
+    """
+
+    def __init__(self, xw, skipna=False):
+        super().__init__(skipna)
+        if isinstance(xw, (str, bytes)) or not np.isscalar(xw):
+            raise ValueError(f"Non-numerical value presented: {xw}. Please make sure the value to count is int or float.")
+        self.xw = xw
+        self.occurrences = 0
+
+
+    def _update_chunk(self, array):
+        self.occurrences += countarray(array, self.xw)
+
+
+    def _merge_state(self, other):
+        if other.xw != self.xw and not (other.xw != other.xw and self.xw != self.xw):
+            raise ValueError(f"Cannot merge the count of {other.xw} into the count of {self.xw}.")
+        self.occurrences += other.occurrences
+
+
+    @property
+    def result(self):
+        self._check_not_empty()
+        return self.occurrences
+
+
+
+"""
+Quantiles by selection. Instead of sorting all values, np.partition only places the values at the needed 
+positions (introselect), which takes linear time. The quantiles are interpolated linearly between the two 
+nearest values, like numpy's default percentile method.
+"""
+
+
+
+def _check_quantiles(q):
+    """
+    Return q as a 1D float array, checking that every quantile is between 0 and 1.
+    """
+
+    qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+    if qs.ndim != 1 or np.any(np.isnan(qs)) or np.any((qs < 0) | (qs > 1)):
+        raise ValueError(f"Invalid quantile {q}. Please make sure all quantiles are between 0 and 1.")
+    return qs
+
+
+
+def quantile(values, q, skipna=False):
+    """
+    Calculate one or several quantiles of the values, e.g. q=0.5 for the median or q=[0.9, 0.95, 0.99].
+
+    Parameters:
+    values (array-like of int/float): A NumPy array, memoryview, array.array or list of numbers.
+    q (float or list of float): The quantile(s), between 0 and 1.
+    skipna (bool, optional): Ignore NaN values. Defaults to False, in which case NaN values give NaN.
+
+    Returns:
+    float or ndarray: The quantile, or an array with one value per quantile if q is a list.
+
+    Raises:
+    ValueError: If the values are empty or non-numerical, with skipna only NaN, or a quantile is not between 0 and 1.
+    """
+
+    array = _as_numeric_array(values).astype(np.float64, copy=False)
+    _check_not_all_nan(array, skipna)
+    qs = _check_quantiles(q)
+
+    nan = np.isnan(array)
+    if nan.any():
+        if not skipna:
+            result = np.full(len(qs), np.nan)
+            return result if np.ndim(q) else float(result[0])
+        array = array[~nan]
+
+    position = qs * (len(array) - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+
+    selected = np.partition(array, np.unique(np.concatenate([lower, upper])))
+    result = selected[lower] + (selected[upper] - selected[lower]) * (position - lower)
+
+    return result if np.ndim(q) else float(result[0])
+
+
+
+def batched_quantile(matrix, q):
+    """
+    Calculate quantiles of every row of a matrix, ignoring NaN, e.g. the daily median of a (days, 24) matrix.
+
+    Parameters:
+    matrix (2D array-like of float): One row per group, NaN for missing values.
+    q (float or list of float): The quantile(s), between 0 and 1.
+
+    Returns:
+    ndarray: One value per row, or an array of shape (len(q), rows) if q is a list. Rows without any value give NaN.
+
+    Raises:
+    ValueError: If the matrix is not two-dimensional and numerical, or a quantile is not between 0 and 1.
+    """
+
+    matrix = np.asarray(matrix)
+    if matrix.ndim != 2 or matrix.dtype.kind not in "biuf":
+        raise ValueError("Please make sure the matrix is two-dimensional and all items are int and float.")
+    qs = _check_quantiles(q)
+
+    matrix = matrix.astype(np.float64, copy=False)
+    rows = matrix.shape[0]
+    if rows == 0 or matrix.shape[1] == 0:
+        result = np.full((len(qs), rows), np.nan)
+        return result if np.ndim(q) else result[0]
+
+    # np.partition places NaN after all values, so the valid values of a row are its first count values
+    count = np.count_nonzero(~np.isnan(matrix), axis=1)
+    position = qs[:, None] * np.maximum(count - 1, 0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+
+    selected = np.partition(matrix, np.unique(np.concatenate([lower.ravel(), upper.ravel()])), axis=1)
+    low_values = np.take_along_axis(selected, lower.T, axis=1).T
+    high_values = np.take_along_axis(selected, upper.T, axis=1).T
+
+    result = low_values + (high_values - low_values) * (position - lower)
+    result[:, count == 0] = np.nan
+
+    return result if np.ndim(q) else result[0]
+
+
+
+"""
+Rolling windows, e.g. the running 8-hour and 24-hour means used for regulatory limits. A window position 
+only gives a result when at least min_count of its values are not NaN; by default this is 75% of the 
+window, the usual data capture rule. Every function takes linear time, whatever the window length.
+"""
+
+
+
+def _check_window(window, min_count):
+    """
+    Return the window and the minimum count of values, checking both and defaulting min_count to 75% of the window.
+    """
+
+    if not isinstance(window, (int, np.integer)) or window < 1:
+        raise ValueError(f"Invalid window {window}. Please make sure the window is a positive integer.")
+    if min_count is None:
+        min_count = int(np.ceil(0.75 * window))
+    if not 1 <= min_count <= window:
+        raise ValueError(f"Invalid min_count {min_count}. Please make sure it is between 1 and the window {window}.")
+    return int(window), int(min_count)
+
+
+
+def rolling_mean(values, window, min_count=None):
+    """
+    Calculate the running mean over the last window values at every position.
+
+    Parameters:
+    values (array-like of int/float): The values, NaN for missing data.
+    window (int): The number of values in the window, e.g. 24 for a 24-hour running mean of hourly data.
+    min_count (int, optional): The minimum number of values in a window. Defaults to 75% of the window.
+
+    Returns:
+    ndarray: The mean of values[i - window + 1 : i + 1] at every position i, NaN where the window has fewer than min_count values.
+
+    Raises:
+    ValueError: If the values are empty or non-numerical, or the window or min_count are invalid.
+
+    Note:
+    The sums and counts of all windows are taken from two cumulative sums, so each value is only read once.
+    """
+
+    array = _as_numeric_array(values).astype(np.float64, copy=False)
+    window, min_count = _check_window(window, min_count)
+
+    valid = ~np.isnan(array)
+    sums = np.cumsum(np.where(valid, array, 0.0))
+    counts = np.cumsum(valid)
+
+    # Subtract the cumulative sums up to the start of each full window, in place
+    sums[window:] -= sums[:-window]
+    counts[window:] -= counts[:-window]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        np.divide(sums, counts, out=sums)
+    sums[counts < min_count] = np.nan
+    return sums
+
+
+
+class RollingWindow:
+    """
+    Streams values through a sliding window and keeps the window's mean, minimum and maximum up to date.
+
+    The minimum and maximum are kept in monotonic queues, so every value is added and removed at most once 
+    and each update takes constant time on average. Use it for live data that arrives one reading at a time.
+
+    Parameters:
+    window (int): The number of values in the window.
+    min_count (int, optional): The minimum number of values for a result. Defaults to 75% of the window.
+    """
+
+    def __init__(self, window, min_count=None):
+        self.window, self.min_count = _check_window(window, min_count)
+        self.position = 0
+        self.total = 0.0
+        self.count = 0
+        self._values = deque()
+        self._minimum = deque()
+        self._maximum = deque()
+
+
+    def push(self, value):
+        """
+        Add the next value (NaN for missing data) and drop the value that leaves the window.
+
+        Returns:
+        The rolling window itself.
+        """
+
+        value = float(value)
+
+        # Drop the value that leaves the window
+        if len(self._values) == self.window:
+            old = self._values.popleft()
+            if old == old:
+                self.total -= old
+                self.count -= 1
+        oldest = self.position - self.window + 1
+        while self._minimum and self._minimum[0][0] < oldest:
+            self._minimum.popleft()
+        while self._maximum and self._maximum[0][0] < oldest:
+            self._maximum.popleft()
+
+        self._values.append(value)
+        if value == value:
+            self.total += value
+            self.count += 1
+
+            # Values that can never be the minimum (or maximum) again are removed from the back of the queue
+            while self._minimum and self._minimum[-1][1] >= value:
+                self._minimum.pop()
+            self._minimum.append((self.position, value))
+            while self._maximum and self._maximum[-1][1] <= value:
+                self._maximum.pop()
+            self._maximum.append((self.position, value))
+
+        self.position += 1
+        return self
+
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count >= self.min_count else np.nan
+
+
+    @property
+    def minimum(self):
+        return self._minimum[0][1] if self.count >= self.min_count else np.nan
+
+
+    @property
+    def maximum(self):
+        return self._maximum[0][1] if self.count >= self.min_count else np.nan
+
+
+
+def _rolling_extreme(values, window, min_count, statistic):
+    """
+    Run the values through a RollingWindow and collect the statistic ('minimum' or 'maximum') at every position.
+    """
+
+    array = _as_numeric_array(values).astype(np.float64, copy=False)
+    rolling = RollingWindow(window, min_count)
+
+    result = np.empty(len(array))
+    for i, value in enumerate(array.tolist()):
+        result[i] = getattr(rolling.push(value), statistic)
+    return result
+
+
+
+def rolling_max(values, window, min_count=None):
+    """
+    Calculate the running maximum over the last window values at every position.
+
+    Parameters:
+    values (array-like of int/float): The values, NaN for missing data.
+    window (int): The number of values in the window.
+    min_count (int, optional): The minimum number of values in a window. Defaults to 75% of the window.
+
+    Returns:
+    ndarray: The maximum of values[i - window + 1 : i + 1] at every position i, NaN where the window has fewer than min_count values.
+
+    Raises:
+    ValueError: If the values are empty or non-numerical, or the window or min_count are invalid.
+    """
+
+    return _rolling_extreme(values, window, min_count, "maximum")
+
+
+
+def rolling_min(values, window, min_count=None):
+    """
+    Calculate the running minimum over the last window values at every position.
+
+    Parameters:
+    values (array-like of int/float): The values, NaN for missing data.
+    window (int): The number of values in the window.
+    min_count (int, optional): The minimum number of values in a window. Defaults to 75% of the window.
+
+    Returns:
+    ndarray: The minimum of values[i - window + 1 : i + 1] at every position i, NaN where the window has fewer than min_count values.
+
+    Raises:
+    ValueError: If the values are empty or non-numerical, or the window or min_count are invalid.
+    """
+
+    return _rolling_extreme(values, window, min_count, "minimum")
+
+
+
+def run_lengths(mask):
+    """
+    Find the runs of consecutive True values in a boolean array (run-length encoding).
+
+    Parameters:
+    mask (array-like of bool): A one-dimensional boolean array, e.g. values > threshold.
+
+    Returns:
+    starts (ndarray): The position of the first value of every run.
+    lengths (ndarray): The number of values in every run.
+
+    Raises:
+    ValueError: If the mask is not one-dimensional.
+    """
+
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim != 1:
+        raise ValueError("Invalid mask. Please make sure the mask is a one-dimensional array.")
 
+    # A run starts where the padded mask steps up from 0 to 1 and ends where it steps back down
+    steps = np.diff(np.concatenate([[0], mask.view(np.int8), [0]]))
+    starts = np.flatnonzero(steps == 1)
+    ends = np.flatnonzero(steps == -1)
+    return starts, ends - starts
 